@@ -0,0 +1,104 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Benchmark comparing the quadratic duplicate check that
+DBManager.append_to_list originally used with the current linear
+version, with and without deduplication. Rows are read from an
+in-memory log_table of each size.
+
+Usage (from the repository root):
+$ python benchmarks/bench_append_to_list.py
+$ python benchmarks/bench_append_to_list.py 1000 10000 50000
+"""
+
+import os
+import sqlite3
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dbmanager
+
+"""
+This file is part of Tkinter Password Manager.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+
+DEFAULT_SIZES = (1000, 2000, 5000, 10000, 20000, 50000)
+QUADRATIC_LIMIT = 20000  # the original takes minutes past this
+
+
+def quadratic_append_to_list(box, param):
+    """
+    The original append_to_list, kept here as the baseline.
+
+    Args taken:
+    -box
+    -param
+    """
+    items = param.fetchall()
+    for item in items:
+        if item not in box:
+            box.append(item)
+    return box
+
+
+def make_log(num_rows):
+    """
+    Creates an in-memory log_table with num_rows logins.
+
+    Args taken:
+    -num_rows (int)
+
+    Returns the connection.
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE log_table(logID INTEGER PRIMARY KEY AUTOINCREMENT, date STR, user STR, success STR)")
+    conn.executemany("INSERT INTO log_table (date, user, success) VALUES (?,?,?)",
+                     (("2018-01-%02d %02d:%02d:%02d" % (x % 28 + 1, x % 24, x % 60, x % 59), "user%d" % (x % 7),
+                       "Failed" if x % 5 == 0 else "Succesful") for x in range(num_rows)))
+    return conn
+
+
+def run(sizes):
+    """
+    Times every version for each size and prints the results.
+
+    Args taken:
+    -sizes (list of ints)
+    """
+    print("%9s %14s %14s %14s" % ("rows", "quadratic", "linear", "linear dedupe"))
+    for num_rows in sizes:
+        conn = make_log(num_rows)
+
+        def timed(func, *args):
+            return min(timeit.repeat(lambda: func([], conn.execute("SELECT * FROM log_table"), *args),
+                                     number=1, repeat=3))
+
+        if num_rows <= QUADRATIC_LIMIT:
+            quadratic = "%13.3fs" % timed(quadratic_append_to_list)
+        else:
+            quadratic = "%14s" % "skipped"
+        linear = timed(dbmanager.DBManager.append_to_list)
+        dedupe = timed(dbmanager.DBManager.append_to_list, True)
+        print("%9d %s %13.3fs %13.3fs" % (num_rows, quadratic, linear, dedupe))
+        conn.close()
+
+
+if __name__ == '__main__':
+    run([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
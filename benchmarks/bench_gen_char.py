@@ -0,0 +1,98 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Micro-benchmark comparing the rejection loop that VernamEncrypt._gen_char
+originally used with the current per-character and whole-buffer
+(random pool) shift generation.
+
+Usage (from the repository root):
+$ python benchmarks/bench_gen_char.py
+$ python benchmarks/bench_gen_char.py 250000
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ndv_cypher
+
+"""
+This file is part of Tkinter Password Manager.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+
+DEFAULT_CHARS = 1000000
+
+
+def rejection_gen_char(val):
+    """
+    The original _gen_char, kept here as the baseline. Draws until
+    the shifted character is printable and not a backslash.
+
+    Args taken: val (int)
+
+    Returns new_value (str), shift (int) and draws (int).
+    """
+    draws = 0
+    shift = 0
+    new_value = ""
+    valid = False
+    while not valid:
+        shift = random.randint((0 - val), (127 - val))
+        draws += 1
+        new_value = chr(val + shift)
+        if 32 <= ord(new_value) < 127 and ord(new_value) != 92:
+            valid = True
+    return new_value, shift, draws
+
+
+def run(num_chars):
+    """
+    Times both samplers over the same characters and prints the results.
+
+    Args taken:
+    -num_chars (int)
+    """
+    values = [ord(char) for char in random.choices(string.printable, k=num_chars)]
+
+    def old():
+        for val in values:
+            rejection_gen_char(val)
+
+    def new():
+        for val in values:
+            ndv_cypher.VernamEncrypt._gen_char(val)
+
+    def buffer():
+        ndv_cypher.VernamEncrypt._gen_chars(bytes(values))
+
+    old_time = min(timeit.repeat(old, number=1, repeat=3))
+    new_time = min(timeit.repeat(new, number=1, repeat=3))
+    buffer_time = min(timeit.repeat(buffer, number=1, repeat=3))
+    total_draws = sum(rejection_gen_char(val)[2] for val in values)
+    print("characters:          %d" % num_chars)
+    print("rejection loop:      %.3fs (%.2f draws/char)" % (old_time, total_draws / num_chars))
+    print("_gen_char:           %.3fs (speedup %.2fx)" % (new_time, old_time / new_time))
+    print("_gen_chars:          %.3fs (speedup %.2fx)" % (buffer_time, old_time / buffer_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_CHARS)
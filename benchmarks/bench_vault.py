@@ -0,0 +1,189 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Throughput benchmark for the cypher and RecordManager. Generates
+synthetic vaults with realistic field lengths in a temporary database,
+then times encryption, decryption, write_encrypted() and create_dict()
+for each vault size. Results are written as JSON so runs can be
+compared.
+
+Usage (from the repository root):
+$ python benchmarks/bench_vault.py
+$ python benchmarks/bench_vault.py --sizes 1000 10000 --output before.json
+$ python benchmarks/bench_vault.py --cipher keystream --workers 4 --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # RecordManager reads data/settings.ini
+
+import ndv_cypher
+import recordmanager
+
+"""
+This file is part of Tkinter Password Manager.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+
+SIZES = (1000, 10000, 100000, 1000000)
+SEED = 1234
+STAGES = ("encrypt", "decrypt", "write_encrypted", "create_dict")
+TLDS = (".com", ".co.uk", ".org", ".net", ".io")
+EMAIL_DOMAINS = ("@gmail.com", "@outlook.com", "@yahoo.co.uk", "@protonmail.com")
+PASSWORD_CHARS = string.ascii_letters + string.digits + "!#$%&()*+,-./:;<=>?@[]^_{|}~"
+NON_ASCII_NAMES = ("josé", "zoë", "françois", "jürgen", "åsa")
+
+
+def generate_vault(num_records, seed=SEED):
+    """
+    Generates a record dictionary like the one create_dict() returns.
+    Sites are 8-30 characters, usernames are emails or handles (about
+    1% non-ascii) and passwords are 8-24 characters.
+
+    Args taken:
+    -num_records (int)
+    -seed=SEED (int)
+
+    Returns record_dict (dictionary)
+    """
+    rand = random.Random(seed)
+    record_dict = {}
+    for x in range(1, num_records + 1):
+        site = "www." + "".join(rand.choices(string.ascii_lowercase, k=rand.randint(3, 20))) + rand.choice(TLDS)
+        if rand.random() < 0.01:
+            username = rand.choice(NON_ASCII_NAMES) + str(rand.randint(1, 999))
+        elif rand.random() < 0.6:
+            name = "".join(rand.choices(string.ascii_lowercase + ".", k=rand.randint(4, 16)))
+            username = name + rand.choice(EMAIL_DOMAINS)
+        else:
+            username = "".join(rand.choices(string.ascii_letters + string.digits + "_", k=rand.randint(5, 15)))
+        password = "".join(rand.choices(PASSWORD_CHARS, k=rand.randint(8, 24)))
+        record_dict[x] = (site, username, password)
+    return record_dict
+
+
+def timed(func, *args):
+    """
+    Calls func with args.
+
+    Returns the result and the time taken in seconds.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def run_size(num_records, cipher, workers):
+    """
+    Times every stage for one vault size.
+
+    Args taken:
+    -num_records (int)
+    -cipher (str)
+    -workers (int)
+
+    Returns a dictionary of results.
+    """
+    record_dict = generate_vault(num_records)
+    with tempfile.TemporaryDirectory() as directory:
+        manage_records = recordmanager.RecordManager(os.path.join(directory, "bench.db"))
+        manage_records.db_manager.create_databases()
+        manage_records.workers = workers
+        manage_records.master_key = None
+        if cipher == "keystream":
+            manage_records.master_key = ndv_cypher.KeystreamCipher.generate_master_key()
+
+        bulk_writes = []
+        manage_records.db_manager.timing_hook = lambda operation, rows, seconds: bulk_writes.append(rows / seconds)
+
+        timings = {}
+        (records, keys), timings["encrypt"] = timed(manage_records.record_encryption, record_dict)
+        rows = [(x + 1,) + records[x] + (keys[x] or (None, None, None)) for x in range(len(records))]
+        decrypted, timings["decrypt"] = timed(recordmanager._decrypt_rows, rows, manage_records.master_key)
+        _, timings["write_encrypted"] = timed(manage_records.write_encrypted, record_dict, True)
+        read_dict, timings["create_dict"] = timed(manage_records.create_dict)
+        manage_records.db_manager.close()
+
+    result = {"records": num_records,
+              "seconds": timings,
+              "records_per_second": {stage: num_records / timings[stage] for stage in STAGES},
+              "bulk_write_rows_per_second": bulk_writes[-1],
+              "round_trip_ok": [record[1:] for record in decrypted] == list(record_dict.values()),
+              "read_back_ok": len(read_dict) == num_records}
+    return result
+
+
+def compare(results, baseline):
+    """
+    Prints how each stage changed against an earlier run. Ratios above
+    1 mean the stage is slower than in the baseline.
+
+    Args taken:
+    -results (dictionary)
+    -baseline (dictionary)
+    """
+    previous = {result["records"]: result for result in baseline["results"]}
+    for result in results["results"]:
+        old = previous.get(result["records"])
+        if old is None:
+            continue
+        changes = ["%s %.2fx" % (stage, result["seconds"][stage] / old["seconds"][stage]) for stage in STAGES]
+        print("%9d records: %s" % (result["records"], ", ".join(changes)), file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="vault sizes to generate")
+    parser.add_argument("--cipher", choices=("vernam", "keystream"), default="vernam")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (0 = none)")
+    parser.add_argument("--output", help="file to write the JSON results to (default: stdout)")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = {"python": platform.python_version(),
+               "platform": platform.platform(),
+               "numpy": ndv_cypher.numpy is not None,
+               "cipher": args.cipher,
+               "workers": args.workers,
+               "results": []}
+    for num_records in args.sizes:
+        print("running %d records..." % num_records, file=sys.stderr)
+        results["results"].append(run_size(num_records, args.cipher, args.workers))
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
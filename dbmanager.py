@@ -5,7 +5,10 @@
 """
 Module for managing program-specific database interactions.
 
-Contains one class, DBManager.
+Contains three classes:
+-DBManager
+-LogWriter
+-DBExecutor
 
 Usage example:
 
@@ -13,11 +16,24 @@ Usage example:
 >>> db.create_databases()
 """
 
+import asyncio
+import atexit
+import collections
+import csv
+import datetime
+import gzip
+import hashlib
+import os
 import sqlite3
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import *
 from tkinter import messagebox as mb
 
 import ndv_cypher
+from filemanager import INIFile
 
 """
 This file is part of Tkinter Password Manager.
@@ -39,27 +55,156 @@ along with this program; if not, see <http://www.gnu.org/licenses/>.
 INFO_BOX_TITLE = "Information"
 ERROR_BOX_TITLE = "Error"
 WARNING_TITLE = "Warning"
+DB_FILE = "data/data.db"
+SETTINGS_FILE = "data/settings.ini"
+# performance profile applied to every connection, each one can be overridden under [Database] in settings.ini
+DEFAULT_PRAGMAS = {"journal mode": "wal",  # readers aren't blocked by the autosave writer
+                   "synchronous": "normal",  # safe with wal, only the last commits can be lost on power failure
+                   "cache size": "-16000",  # negative values are in KiB, so 16MB of page cache
+                   "mmap size": "268435456",  # 256MB memory mapped reads
+                   "temp store": "memory"}
+# setting name: (pragma, allowed values, or None for any integer)
+PRAGMAS = {"journal mode": ("journal_mode", ("delete", "truncate", "persist", "memory", "wal", "off")),
+           "synchronous": ("synchronous", ("off", "normal", "full", "extra", "0", "1", "2", "3")),
+           "cache size": ("cache_size", None),
+           "mmap size": ("mmap_size", None),
+           "temp store": ("temp_store", ("default", "file", "memory", "0", "1", "2"))}
+FETCH_CHUNK_SIZE = 500  # rows pulled from a cursor at a time when streaming
+LOG_PAGE_SIZE = 20  # login records read at a time by read_log_page()
+LOG_ARCHIVE_FILE = "data/log_archive.csv.gz"
+LOG_BATCH_SIZE = 1000  # expired login records archived and deleted per transaction
+LOG_FLUSH_SIZE = 50  # buffered login records that trigger a flush
+LOG_FLUSH_INTERVAL = 2.0  # seconds between flushes of buffered login records
+FUTURE_POLL_INTERVAL = 50  # milliseconds between checks by when_done() on a database operation
+BACKUP_PAGES = 256  # database pages copied per step of a hot backup
+BACKUP_SLEEP = 0.005  # seconds between steps of a hot backup, so writers get a turn
+# tables of the file written by write_record_changes() and read by apply_record_changes()
+CHANGES_TABLES = ("CREATE TABLE passw_table(personID INTEGER PRIMARY KEY, site TEXT, username TEXT, password TEXT)",
+                  "CREATE TABLE key_table(personID INTEGER PRIMARY KEY, sitekey BLOB, usernamekey BLOB, "
+                  "passwordkey BLOB)",
+                  "CREATE TABLE deleted_records(personID INTEGER PRIMARY KEY)")
+# schema versions, stored in PRAGMA user_version: (version, description, DBManager method)
+MIGRATIONS = ((1, "Create tables", "_migration_create_tables"),
+              (2, "Convert keys to the binary format", "_migration_binary_keys"),
+              (3, "Index and count login records", "_migration_log_indexes"),
+              (4, "Store text without numeric conversion", "_migration_text_columns"))
+FAILED = "Failed"  # value of log_table.success for failed logins, anything else was successful
+LOG_PERIODS = {"hour": 13, "day": 10}  # characters of "YYYY-MM-DD HH:MM:SS" that make up each period
+# records with their keys. keys are NULL for records that have none (keystream or unencrypted records)
+RECORD_QUERY = ("SELECT personID, site, username, password, sitekey, usernamekey, passwordkey "
+                "FROM passw_table LEFT JOIN key_table USING (personID)")
+# text records without keys, only orphans if key_table isn't empty (keystream records are blobs)
+ORPHAN_RECORDS_QUERY = ("SELECT personID FROM passw_table WHERE typeof(site) != 'blob' "
+                        "AND personID NOT IN (SELECT personID FROM key_table) ORDER BY personID")
+ORPHAN_KEYS_QUERY = ("SELECT personID FROM key_table "
+                     "WHERE personID NOT IN (SELECT personID FROM passw_table) ORDER BY personID")
+_write_locks = {}  # one writer lock per database file, shared by every DBManager using it
+_write_locks_lock = threading.Lock()
+_managers = weakref.WeakSet()  # every DBManager, so replace_database() can close the ones using a file
+
+
+def _get_write_lock(filename):
+    """
+    Returns the writer lock for a database file, creating it the first
+    time. Re-entrant, so writing methods can call each other.
+
+    Args taken:
+    -filename (str)
+    """
+    if filename != ":memory:":
+        filename = os.path.abspath(filename)
+    with _write_locks_lock:
+        return _write_locks.setdefault(filename, threading.RLock())
+
+
+def replace_database(source, filename):
+    """
+    Moves the database file "source" over "filename" with os.replace,
+    so the database is swapped in one step. Every DBManager using
+    "filename" closes its connections first, and writers are held off
+    until the new file is in place. Connections are reopened on the new
+    file the next time they're used.
+
+    Args taken:
+    -source (str, file name)
+    -filename (str, file name)
+    """
+    target = os.path.abspath(filename)
+
+    def close_managers():
+        with _write_locks_lock:
+            managers = [manager for manager in _managers if os.path.abspath(manager.filename) == target]
+        for manager in managers:
+            manager.close()
+
+    with _get_write_lock(filename):
+        close_managers()
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(filename + suffix):
+                os.remove(filename + suffix)  # would be replayed onto the new file
+        os.replace(source, filename)
+        close_managers()  # in case a reader opened a connection to the old file meanwhile
 
 
 class DBManager:
     """
     Class to manage all sqlite3 database operations.
 
-    Does not take any arguments.
+    Optionally takes the database file to use, which is DB_FILE by
+    default (benchmarks use this for synthetic vaults).
+
+    The connection is tuned with the pragmas in DEFAULT_PRAGMAS, or
+    the ones under [Database] in settings.ini.
+
+    Every thread gets its own connection (and cursor) through the conn
+    and cur properties, opened the first time that thread uses them, so
+    a DBManager can be shared with background threads. Writes from all
+    threads and all DBManagers on the same file are serialized on one
+    writer lock. Call close() once finished with it.
 
     Functions:
+    -conn [PROPERTY]
+    -cur [PROPERTY]
+    -close(self)
+    -apply_pragmas(self)
+    -read_pragmas(self)
+    -checkpoint(self)
     -create_databases(self)
+    -schema_version(self)
+    -migrate(self, dry_run=False)
+    -convert_key_table(self)
     -count_records(self)
     -write_to_main(self, sitetext, untext, pwtext)
     -write_to_keys(self, sitetext, untext, pwtext)
+    -write_records_bulk(self, encrypted_rows, key_rows, replace=False, person_ids=None)
+    -write_changes(self, added_rows, changed_rows, deleted_ids)
     -write_to_log(self, date, user, success)
+    -write_log_bulk(self, rows)
     -read_log(self)
+    -read_log_page(self, after=None, limit=LOG_PAGE_SIZE)
+    -count_log(self)
     -clear_log(self, loginrec)
+    -login_summary(self, period="day", limit=-1)
+    -failure_streaks(self)
+    -last_successes(self)
+    -apply_log_retention(self, max_age_days=None, max_rows=None, archive_file=None)
+    -compact(self)
+    -backup(self, target, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, progress=None)
+    -record_hashes(self)
+    -write_record_changes(self, target, person_ids, deleted_ids)
+    -apply_record_changes(self, source)
     -read_all_from_db(self)
+    -iter_all_from_db(self, chunk_size=FETCH_CHUNK_SIZE)
+    -iter_chunks_from_db(self, chunk_size=FETCH_CHUNK_SIZE)
+    -read_record(self, person_id)
+    -find_orphans(self)
+    -iter_table(self, table, chunk_size=FETCH_CHUNK_SIZE)
     -clear_db(self, table, win)
     -check_db(self)
+    -check_db_counts(self)
+    -check_integrity(self)
     -export_plain_db(self, record_dict, filename)
-    -append_to_list(box, param) [STATIC]
+    -append_to_list(box, param, dedupe=False) [STATIC]
 
     Usage example:
 
@@ -71,13 +216,136 @@ class DBManager:
 
     """
 
-    def __init__(self):
-        self.conn = sqlite3.connect("data/data.db")
-        self.cur = self.conn.cursor()
+    def __init__(self, filename=DB_FILE):
+        self.filename = filename
+        self.timing_hook = None  # called as timing_hook(operation, rows, seconds) after bulk writes
+        self.write_lock = _get_write_lock(filename)
+        self._local = threading.local()  # holds each thread's connection and cursor
+        self._connections = []  # every thread's connection, so close() can reach them all
+        self._connections_lock = threading.Lock()
+        with _write_locks_lock:
+            _managers.add(self)
+        self.conn  # connection of the creating thread is opened straight away
+
+    @property
+    def conn(self):
+        """
+        The calling thread's connection, opened and tuned the first
+        time the thread uses it.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # only ever used by its own thread, check_same_thread is off so close() can be called from another
+            conn = sqlite3.connect(self.filename, check_same_thread=False)
+            self._local.conn = conn
+            self._local.cur = conn.cursor()
+            with self._connections_lock:
+                self._connections.append(conn)
+            self.apply_pragmas()
+        return conn
+
+    @property
+    def cur(self):
+        """
+        The calling thread's cursor.
+        """
+        self.conn  # makes sure this thread has a connection
+        return self._local.cur
+
+    def close(self):
+        """
+        Closes the connections of every thread. A thread that uses the
+        DBManager afterwards opens a new one.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.close()
+
+        """
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def apply_pragmas(self):
+        """
+        Applies the performance pragmas to the connection. Settings
+        under [Database] in settings.ini override DEFAULT_PRAGMAS, and
+        invalid values are ignored. Returns the pragmas set.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.apply_pragmas()
+        {'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': '-16000', ...}
+
+        """
+        config = INIFile(SETTINGS_FILE).read_file()
+        database = config["Database"] if config.has_section("Database") else {}
+        applied = {}
+        with self.write_lock:  # changing the journal mode needs the database to itself
+            for setting, (pragma, allowed) in PRAGMAS.items():
+                value = str(database.get(setting, DEFAULT_PRAGMAS[setting])).strip().lower()
+                if allowed is None:
+                    valid = value.lstrip("-").isdigit()
+                else:
+                    valid = value in allowed
+                if not valid:
+                    value = DEFAULT_PRAGMAS[setting]
+                # values are checked above, pragmas can't take parameters
+                self.cur.execute("PRAGMA %s = %s" % (pragma, value))
+                applied[pragma] = value
+        return applied
+
+    def read_pragmas(self):
+        """
+        Diagnostic method, returns the pragmas actually in effect on
+        the connection. sqlite can refuse some settings (a database in
+        memory can't use wal, for example), so these can differ from
+        settings.ini.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.read_pragmas()
+        {'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -16000, 'mmap_size': 268435456, 'temp_store': 2,
+        'page_size': 4096}
+
+        """
+        in_effect = {}
+        for pragma in [pragma for pragma, allowed in PRAGMAS.values()] + ["page_size"]:
+            row = self.cur.execute("PRAGMA %s" % pragma).fetchone()
+            in_effect[pragma] = row[0] if row else None  # None if the pragma doesn't apply (mmap in memory)
+        return in_effect
+
+    def checkpoint(self):
+        """
+        Copies everything in the write-ahead log into the database file
+        and empties the log, so the file can be copied on its own (for
+        backups). Does nothing if the database doesn't use wal.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.checkpoint()
+
+        """
+        with self.write_lock:
+            self.conn.commit()
+            self.cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
 
     def create_databases(self):
         """
-        Creates password, key, and log databases if they don't already exist.
+        Creates password, key, and log databases if they don't already
+        exist, and brings existing ones up to date by running
+        migrate(). Returns the report from migrate().
 
         No args taken.
 
@@ -86,7 +354,74 @@ class DBManager:
         >>> manage_db.create_databases()
 
         """
+        return self.migrate()
+
+    def schema_version(self):
+        """
+        Returns the schema version of the database, kept in
+        PRAGMA user_version. 0 is a database from before migrations.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.schema_version()
+        4
+
+        """
+        return self.cur.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, dry_run=False):
+        """
+        Runs every step in MIGRATIONS newer than the database's schema
+        version, in order. Each step runs in its own transaction along
+        with setting user_version, so an upgrade that fails part way
+        stops at the last complete step. Set "dry_run" to True to run
+        the pending steps in one transaction that is then rolled back,
+        to see what would happen and how long it would take. Returns a
+        list of (version, description, seconds) for each step run.
+
+        Steps only work on the stored data, nothing is decrypted.
+
+        Args taken:
+        -dry_run=False (boolean)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.migrate(dry_run=True)
+        [(3, 'Index and count login records', 0.004), (4, 'Store text without numeric conversion', 1.72)]
+
+        """
+        report = []
+        with self.write_lock:
+            self.conn.commit()  # nothing else can be in the transactions below
+            current = self.schema_version()
+            pending = [step for step in MIGRATIONS if step[0] > current]
+            if not pending:
+                return report
+            if dry_run:
+                self.cur.execute("BEGIN")
+            try:
+                for version, description, method in pending:
+                    if not dry_run:
+                        self.cur.execute("BEGIN")
+                    start = time.perf_counter()
+                    getattr(self, method)()
+                    self.cur.execute("PRAGMA user_version = %d" % version)
+                    if not dry_run:
+                        self.conn.commit()
+                    report.append((version, description, time.perf_counter() - start))
+            finally:
+                if self.conn.in_transaction:  # a dry run, or a step that failed
+                    self.conn.rollback()
+        return report
+
+    def _migration_create_tables(self):
+        """
+        Private method - migration 1, the original tables.
 
+        Can only be called by migrate().
+        """
         self.cur.execute("CREATE TABLE IF NOT EXISTS passw_table(personID INTEGER PRIMARY KEY AUTOINCREMENT, "
                          "site STR, username STR, password STR)")
         self.cur.execute("CREATE TABLE IF NOT EXISTS key_table(personID INTEGER PRIMARY KEY AUTOINCREMENT, "
@@ -95,6 +430,101 @@ class DBManager:
         self.cur.execute("CREATE TABLE IF NOT EXISTS log_table(logID INTEGER PRIMARY KEY AUTOINCREMENT, "
                          "date STR, user STR, success STR)")
 
+    def _migration_binary_keys(self):
+        """
+        Private method - migration 2, converts text keys to the binary
+        key format (see convert_key_table()).
+
+        Can only be called by migrate().
+        """
+        self._convert_keys()
+
+    def _migration_log_indexes(self):
+        """
+        Private method - migration 3, indexes login records for paging
+        and analytics, and keeps a count of them.
+
+        Can only be called by migrate().
+        """
+        # newest first order for read_log_page(), logID breaks ties between logins in the same second
+        self.cur.execute("CREATE INDEX IF NOT EXISTS log_date_index ON log_table(date DESC, logID DESC)")
+        # covers the login analytics, which only read user, date and success (logID comes with the rowid)
+        self.cur.execute("CREATE INDEX IF NOT EXISTS log_user_index ON log_table(user, date, success)")
+        # number of login records, kept up to date by triggers so it's never counted again
+        self.cur.execute("CREATE TABLE IF NOT EXISTS log_count(id INTEGER PRIMARY KEY CHECK (id = 1), "
+                         "count INTEGER NOT NULL)")
+        self.cur.execute("INSERT OR IGNORE INTO log_count (id, count) VALUES (1, (SELECT COUNT(*) FROM log_table))")
+        self.cur.execute("CREATE TRIGGER IF NOT EXISTS log_count_insert AFTER INSERT ON log_table "
+                         "BEGIN UPDATE log_count SET count = count + 1; END")
+        self.cur.execute("CREATE TRIGGER IF NOT EXISTS log_count_delete AFTER DELETE ON log_table "
+                         "BEGIN UPDATE log_count SET count = count - 1; END")
+
+    def _migration_text_columns(self):
+        """
+        Private method - migration 4, rebuilds the tables with TEXT and
+        BLOB columns. "STR" columns have numeric affinity, so sqlite was
+        turning ciphertexts and usernames that look like numbers into
+        numbers. Rows are copied as they are, nothing is re-encrypted.
+
+        Can only be called by migrate().
+        """
+        tables = (("passw_table", "personID INTEGER PRIMARY KEY AUTOINCREMENT, site TEXT, username TEXT, "
+                                  "password TEXT"),
+                  ("key_table", "personID INTEGER PRIMARY KEY AUTOINCREMENT, sitekey BLOB, usernamekey BLOB, "
+                                "passwordkey BLOB, FOREIGN KEY (personID) REFERENCES passw_table(personID)"),
+                  ("log_table", "logID INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, user TEXT, success TEXT"))
+        for table, columns in tables:
+            self.cur.execute("CREATE TABLE %s_new(%s)" % (table, columns))
+            self.cur.execute("INSERT INTO %s_new SELECT * FROM %s" % (table, table))
+            self.cur.execute("DROP TABLE %s" % table)  # its indexes and triggers go with it
+            self.cur.execute("ALTER TABLE %s_new RENAME TO %s" % (table, table))
+        self._migration_log_indexes()
+
+    def convert_key_table(self):
+        """
+        Converts keys stored as space separated text into the binary
+        key format, in place. Keys that can't be packed (shifts of
+        non-ascii characters) are left as text, which is still read
+        by VernamDecrypt. Returns the number of rows converted.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> converted = manage_db.convert_key_table()
+
+        """
+        with self.write_lock, self.conn:  # all rows converted in one transaction
+            return self._convert_keys()
+
+    def _convert_keys(self):
+        """
+        Private method - does the work of convert_key_table(), inside
+        the caller's transaction.
+
+        Can only be called by other methods in class/instance.
+        """
+        converted = 0
+        rows = self.cur.execute("SELECT personID, sitekey, usernamekey, passwordkey FROM key_table WHERE "
+                                "typeof(sitekey) != 'blob' OR typeof(usernamekey) != 'blob' OR "
+                                "typeof(passwordkey) != 'blob'").fetchall()
+        for row in rows:
+            keys = []
+            for key in row[1:]:
+                if isinstance(key, bytes):
+                    keys.append(key)
+                    continue
+                try:
+                    # single shift keys were stored as numbers by the old columns
+                    keys.append(ndv_cypher.VernamEncrypt.pack_key(ndv_cypher.VernamDecrypt.unpack_key(str(key))))
+                except OverflowError:
+                    keys.append(key)
+            if tuple(keys) != tuple(row[1:]):
+                self.cur.execute("UPDATE key_table SET sitekey=?, usernamekey=?, passwordkey=? WHERE personID=?",
+                                 (keys[0], keys[1], keys[2], row[0]))
+                converted += 1
+        return converted
+
     def count_records(self):
         """
         Counts records in password database.
@@ -108,12 +538,8 @@ class DBManager:
         62
 
         """
-        num_of_records = 0
-        self.cur.execute("SELECT * FROM passw_table")
-        passwords = self.cur.fetchall()
-        for x in passwords:
-            num_of_records += 1
-        return num_of_records
+        self.cur.execute("SELECT COUNT(*) FROM passw_table")  # counted by sqlite, no rows are fetched
+        return self.cur.fetchone()[0]
 
     def write_to_main(self, sitetext, untext, pwtext):
         """
@@ -132,9 +558,10 @@ class DBManager:
         >>> manage_db.write_to_main(sitetext, untext, pwtext)
 
         """
-        self.cur.execute("INSERT INTO passw_table (site, username, password) VALUES (?,?,?)", (sitetext, untext,
-                                                                                               pwtext))
-        self.conn.commit()
+        with self.write_lock:
+            self.cur.execute("INSERT INTO passw_table (site, username, password) VALUES (?,?,?)",
+                             (sitetext, untext, pwtext))
+            self.conn.commit()
 
     def write_to_keys(self, sitetext, untext, pwtext):
         """
@@ -152,9 +579,102 @@ class DBManager:
         >>> pwtext, pwkey = ndv_cypher.VernamEncrypt.encrypt("jhAS/123!")
         >>> manage_db.write_to_keys(sitekey, unkey, pwkey)
         """
-        self.cur.execute("INSERT INTO key_table (sitekey, usernamekey, passwordkey) VALUES (?,?,?)",
-                         (sitetext, untext, pwtext))
-        self.conn.commit()
+        with self.write_lock:
+            self.cur.execute("INSERT INTO key_table (sitekey, usernamekey, passwordkey) VALUES (?,?,?)",
+                             (sitetext, untext, pwtext))
+            self.conn.commit()
+
+    def write_records_bulk(self, encrypted_rows, key_rows, replace=False, person_ids=None):
+        """
+        Writes encrypted records and their keys with executemany, all in
+        one transaction. If anything fails nothing is written. key_rows
+        lines up with encrypted_rows, with None for records that have
+        no keys (keystream records). Set "replace" to True to clear both
+        tables first, in the same transaction. Records are written under
+        "person_ids" if given, otherwise they are numbered on from the
+        highest id. Returns the number of rows written, and reports
+        them to timing_hook if one is set.
+
+        Args taken:
+        -encrypted_rows (list of (site, username, password) tuples)
+        -key_rows (list of (sitekey, usernamekey, passwordkey) tuples)
+        -replace=False (boolean)
+        -person_ids=None (list of ints)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> records, keys = manage_records.record_encryption(record_dict)
+        >>> manage_db.timing_hook = lambda operation, rows, seconds: print(rows / seconds, "rows/s")
+        >>> manage_db.write_records_bulk(records, keys, replace=True)
+
+        """
+        start = time.perf_counter()
+        with self.write_lock, self.conn:  # one transaction, committed at the end or rolled back on error
+            if replace:
+                for table in ("key_table", "passw_table"):
+                    self.cur.execute("DELETE FROM %s" % table)
+                    self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name=?", (table,))
+            if person_ids is None:
+                first_id = self.cur.execute("SELECT COALESCE(MAX(personID), 0) + 1 FROM passw_table").fetchone()[0]
+                person_ids = range(first_id, first_id + len(encrypted_rows))
+            # ids are given explicitly so keys always line up with their records
+            self.cur.executemany("INSERT INTO passw_table (personID, site, username, password) VALUES (?,?,?,?)",
+                                 ((person_id,) + tuple(row) for person_id, row in zip(person_ids, encrypted_rows)))
+            rows = max(self.cur.rowcount, 0)
+            self.cur.executemany("INSERT INTO key_table (personID, sitekey, usernamekey, passwordkey) "
+                                 "VALUES (?,?,?,?)",
+                                 ((person_id,) + tuple(keys)
+                                  for person_id, keys in zip(person_ids, key_rows) if keys is not None))
+            rows += max(self.cur.rowcount, 0)
+        if self.timing_hook is not None:
+            self.timing_hook("write_records_bulk", rows, time.perf_counter() - start)
+        return rows
+
+    def write_changes(self, added_rows, changed_rows, deleted_ids):
+        """
+        Saves changes to single records in one transaction: INSERTs for
+        added records, UPDATEs for changed records and DELETEs for
+        deleted ones. Rows are (personID, (site, username, password),
+        keys), where keys is None for keystream records. Returns the
+        number of rows written, and reports them to timing_hook if one
+        is set.
+
+        Args taken:
+        -added_rows (list of tuples)
+        -changed_rows (list of tuples)
+        -deleted_ids (list of ints)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> records, keys = manage_records.record_encryption({32: ("Google", "johndoe1@gmail.com", "jhAS/123!")})
+        >>> manage_db.write_changes([], [(32, records[0], keys[0])], [7, 8])
+
+        """
+        start = time.perf_counter()
+        rows = 0
+        with self.write_lock, self.conn:  # one transaction, committed at the end or rolled back on error
+            for table in ("key_table", "passw_table"):
+                self.cur.executemany("DELETE FROM %s WHERE personID = ?" % table,
+                                     ((person_id,) for person_id in deleted_ids))
+                rows += max(self.cur.rowcount, 0)
+            self.cur.executemany("INSERT INTO passw_table (personID, site, username, password) VALUES (?,?,?,?)",
+                                 ((row[0],) + tuple(row[1]) for row in added_rows))
+            rows += max(self.cur.rowcount, 0)
+            self.cur.executemany("UPDATE passw_table SET site = ?, username = ?, password = ? WHERE personID = ?",
+                                 (tuple(row[1]) + (row[0],) for row in changed_rows))
+            rows += max(self.cur.rowcount, 0)
+            # changed records get new keys, or lose their old ones if they are now keystream records
+            self.cur.executemany("INSERT OR REPLACE INTO key_table (personID, sitekey, usernamekey, passwordkey) "
+                                 "VALUES (?,?,?,?)",
+                                 ((row[0],) + tuple(row[2]) for row in added_rows + changed_rows
+                                  if row[2] is not None))
+            rows += max(self.cur.rowcount, 0)
+            self.cur.executemany("DELETE FROM key_table WHERE personID = ?",
+                                 ((row[0],) for row in changed_rows if row[2] is None))
+            rows += max(self.cur.rowcount, 0)
+        if self.timing_hook is not None:
+            self.timing_hook("write_changes", rows, time.perf_counter() - start)
+        return rows
 
     def write_to_log(self, date, user, success):
         """
@@ -173,8 +693,28 @@ class DBManager:
         >>> manage_db.write_to_log(date, user, success)
 
         """
-        self.cur.execute("INSERT INTO log_table (date, user, success) VALUES (?,?,?)", (date, user, success))
-        self.conn.commit()
+        with self.write_lock:
+            self.cur.execute("INSERT INTO log_table (date, user, success) VALUES (?,?,?)", (date, user, success))
+            self.conn.commit()
+
+    def write_log_bulk(self, rows):
+        """
+        Writes many login records in one transaction. Used by LogWriter.
+
+        Args taken:
+        -rows (list of (date, user, success) tuples)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.write_log_bulk([("2017-11-02 18:17:54", "admin", "Failed"),
+        >>>                           ("2017-11-02 18:17:58", "admin", "Succesful")])
+
+        """
+        start = time.perf_counter()
+        with self.write_lock, self.conn:
+            self.cur.executemany("INSERT INTO log_table (date, user, success) VALUES (?,?,?)", rows)
+        if self.timing_hook is not None:
+            self.timing_hook("write_log_bulk", len(rows), time.perf_counter() - start)
 
     def read_log(self):
         """
@@ -189,9 +729,54 @@ class DBManager:
         """
         box = []
         all_records = self.cur.execute("SELECT * FROM log_table ORDER BY date DESC")
-        box = self.append_to_list(box, all_records)
+        box = self.append_to_list(box, all_records)  # logIDs are unique, no need to dedupe
         return box
 
+    def read_log_page(self, after=None, limit=LOG_PAGE_SIZE):
+        """
+        Reads one page of login records, newest first. "after" is the
+        (date, logID) of the last record on the previous page, or None
+        for the first page. Pages are found through log_date_index, so
+        reading a page doesn't depend on how big the log is.
+
+        Args taken:
+        -after=None (tuple)
+        -limit=LOG_PAGE_SIZE (int)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> page = manage_db.read_log_page()
+        >>> next_page = manage_db.read_log_page((page[-1][1], page[-1][0]))
+
+        """
+        if after is None:
+            self.cur.execute("SELECT * FROM log_table ORDER BY date DESC, logID DESC LIMIT ?", (limit,))
+        else:
+            self.cur.execute("SELECT * FROM log_table WHERE (date, logID) < (?, ?) "
+                             "ORDER BY date DESC, logID DESC LIMIT ?", (after[0], after[1], limit))
+        return self.cur.fetchall()
+
+    def count_log(self):
+        """
+        Returns the number of login records, from the count kept by
+        the log_count triggers rather than counting the table.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.count_log()
+        89
+
+        """
+        try:
+            row = self.cur.execute("SELECT count FROM log_count WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:  # log_count is made by create_databases()
+            row = None
+        if row is None:
+            return self.cur.execute("SELECT COUNT(*) FROM log_table").fetchone()[0]
+        return row[0]
+
     def clear_log(self, loginrec):
         """
         Clears login records.
@@ -212,11 +797,297 @@ class DBManager:
         else:
             mb.showinfo(INFO_BOX_TITLE, 'Login records not cleared.', parent=loginrec)
 
+    def login_summary(self, period="day", limit=-1):
+        """
+        Counts successful and failed logins per user per hour or day,
+        inside sqlite, for the newest "limit" periods (-1 for all).
+        Returns (period, user, successful, failed) rows, newest period
+        first, one for each user who logged in during a period.
+
+        Args taken:
+        -period="day" (str - "hour" or "day")
+        -limit=-1 (int)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.login_summary("hour", 2)
+        [('2018-10-27 19', 'admin', 1, 0), ('2018-10-27 18', 'admin', 2, 3), ('2018-10-27 18', 'nick', 1, 0)]
+
+        """
+        if period not in LOG_PERIODS:
+            raise ValueError("Unknown period: %s" % period)
+        length = LOG_PERIODS[period]
+        # start of the oldest period shown. dates sort as text, so every date in or after it is >= its prefix
+        return self.cur.execute("SELECT substr(date, 1, ?) AS period, user, SUM(success != ?), SUM(success = ?) "
+                                "FROM log_table WHERE date >= (SELECT min(recent) FROM "
+                                "(SELECT DISTINCT substr(date, 1, ?) AS recent FROM log_table "
+                                "ORDER BY recent DESC LIMIT ?)) "
+                                "GROUP BY user, period ORDER BY period DESC, user",
+                                (length, FAILED, FAILED, length, limit)).fetchall()
+
+    def failure_streaks(self):
+        """
+        Finds each user's longest run of failed logins in a row.
+        Returns (user, streak, first date, last date) rows, longest
+        streak first. Runs are found inside sqlite with window
+        functions, by numbering attempts per user and per user and
+        result: the difference is the same for every attempt in a run.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.failure_streaks()
+        [('admin', 6, '2018-10-20 10:01:13', '2018-10-20 10:03:40')]
+
+        """
+        # sqlite fills the bare columns from the row holding MAX(streak)
+        return self.cur.execute("SELECT user, MAX(streak), started, ended FROM ("
+                                "SELECT user, COUNT(*) AS streak, MIN(date) AS started, MAX(date) AS ended FROM ("
+                                "SELECT user, date, success, "
+                                "ROW_NUMBER() OVER (PARTITION BY user ORDER BY date, logID) - "
+                                "ROW_NUMBER() OVER (PARTITION BY user, success ORDER BY date, logID) AS run "
+                                "FROM log_table) WHERE success = ? GROUP BY user, run) "
+                                "GROUP BY user ORDER BY MAX(streak) DESC, user", (FAILED,)).fetchall()
+
+    def last_successes(self):
+        """
+        Returns (user, date) of every user's most recent successful
+        login, most recent first.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.last_successes()
+        [('admin', '2018-10-27 19:32:55')]
+
+        """
+        return self.cur.execute("SELECT user, MAX(date) FROM log_table WHERE success != ? "
+                                "GROUP BY user ORDER BY MAX(date) DESC", (FAILED,)).fetchall()
+
+    def apply_log_retention(self, max_age_days=None, max_rows=None, archive_file=None):
+        """
+        Archives and deletes login records older than "max_age_days",
+        and the oldest ones beyond the newest "max_rows". 0 means no
+        limit. Anything left as None is read from "log max age" and
+        "log max rows" under [Preferences] and "log archive" under
+        [File names] in settings.ini.
+
+        Expired records are appended to a gzipped CSV archive, then
+        deleted LOG_BATCH_SIZE at a time so logins aren't held up for
+        long. If anything was archived, the freed pages are given back
+        with an incremental vacuum. Returns the number of records
+        archived.
+
+        Args taken:
+        -max_age_days=None (int)
+        -max_rows=None (int)
+        -archive_file=None (str)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.apply_log_retention(max_age_days=365, max_rows=10000)
+        1520
+
+        """
+        config = INIFile(SETTINGS_FILE).read_file()
+        preferences = config["Preferences"] if config.has_section("Preferences") else {}
+        if max_age_days is None:
+            max_age_days = int(preferences.get("log max age", "0") or 0)
+        if max_rows is None:
+            max_rows = int(preferences.get("log max rows", "0") or 0)
+        if archive_file is None:
+            file_names = config["File names"] if config.has_section("File names") else {}
+            archive_file = file_names.get("log archive", LOG_ARCHIVE_FILE)
+
+        # everything before the boundary (date, logID) has expired, the later of the two limits wins
+        boundary = None
+        if max_age_days > 0:
+            cutoff = datetime.datetime.now() - datetime.timedelta(days=max_age_days)
+            boundary = (cutoff.strftime("%Y-%m-%d %H:%M:%S"), 0)
+        if max_rows > 0:
+            oldest_kept = self.cur.execute("SELECT date, logID FROM log_table ORDER BY date DESC, logID DESC "
+                                           "LIMIT 1 OFFSET ?", (max_rows - 1,)).fetchone()
+            if oldest_kept is not None and (boundary is None or oldest_kept > boundary):
+                boundary = oldest_kept
+        if boundary is None:
+            return 0
+
+        archived = 0
+        while True:
+            with self.write_lock:
+                rows = self.cur.execute("SELECT * FROM log_table WHERE (date, logID) < (?, ?) "
+                                        "ORDER BY date, logID LIMIT ?",
+                                        (boundary[0], boundary[1], LOG_BATCH_SIZE)).fetchall()
+                if not rows:
+                    break
+                new_archive = not os.path.exists(archive_file)
+                # archived before deleting, so a crash can only leave a record in both places
+                with gzip.open(archive_file, "at", encoding="UTF-8", newline="") as archive:
+                    writer = csv.writer(archive)
+                    if new_archive:
+                        writer.writerow(["logID", "Date", "User", "Success"])
+                    writer.writerows(rows)
+                with self.conn:
+                    self.cur.executemany("DELETE FROM log_table WHERE logID = ?", ((row[0],) for row in rows))
+                archived += len(rows)
+        if archived > 0:
+            self.compact()
+        return archived
+
+    def compact(self):
+        """
+        Gives pages freed by deleted rows back to the file system with
+        an incremental vacuum. The first time, the database is switched
+        to incremental auto vacuum, which needs one full VACUUM.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.compact()
+
+        """
+        with self.write_lock:
+            self.conn.commit()
+            if self.cur.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = incremental
+                self.cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                self.cur.execute("VACUUM")  # only takes effect after rebuilding the file
+            self.cur.execute("PRAGMA incremental_vacuum").fetchall()  # runs as its rows are stepped through
+
+    def backup(self, target, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP, progress=None):
+        """
+        Copies the database into the file "target" with the sqlite
+        backup API, while it stays open and in use. "pages" pages are
+        copied per step with "sleep" seconds between steps, so other
+        threads can keep writing. A write from another connection
+        restarts the copy, which always ends up as a consistent
+        snapshot. "progress" is called as progress(remaining, total)
+        after each step. Reports the pages copied to timing_hook if
+        one is set.
+
+        Args taken:
+        -target (str, file name)
+        -pages=BACKUP_PAGES (int, -1 for all at once)
+        -sleep=BACKUP_SLEEP (float)
+        -progress=None (function)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.backup("/tmp/data.db", progress=lambda remaining, total: print(remaining, "pages left"))
+
+        """
+        start = time.perf_counter()
+        total = [0]
+
+        def step(status, remaining, page_count):
+            total[0] = page_count
+            if progress is not None:
+                progress(remaining, page_count)
+
+        target_conn = sqlite3.connect(target)
+        try:
+            self.conn.commit()  # a transaction open on this connection would be left out of the snapshot
+            self.conn.backup(target_conn, pages=pages, progress=step, sleep=sleep)
+        finally:
+            target_conn.close()
+        if self.timing_hook is not None:
+            self.timing_hook("backup", total[0], time.perf_counter() - start)
+
+    def record_hashes(self):
+        """
+        Hashes every record as it's stored, encrypted fields and keys
+        together. Returns a dictionary of personIDs to hex digests,
+        used to find the records changed since a backup.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> hashes = manage_db.record_hashes()
+
+        """
+        hashes = {}
+        for rows in self.iter_chunks_from_db():
+            for row in rows:
+                # repr keeps str and bytes fields apart, so equal hashes mean equal rows
+                hashes[row[0]] = hashlib.blake2b(repr(row[1:]).encode("utf-8"), digest_size=16).hexdigest()
+        return hashes
+
+    def write_record_changes(self, target, person_ids, deleted_ids):
+        """
+        Copies the records with the given personIDs, and their keys,
+        into a new database file "target", along with the ids of
+        deleted records. Rows are copied as they're stored, nothing is
+        decrypted. The file is replayed by apply_record_changes().
+        Returns the number of records copied.
+
+        Args taken:
+        -target (str, file name)
+        -person_ids (iterable of ints)
+        -deleted_ids (iterable of ints)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> manage_db.write_record_changes("changes.db", [3, 4], [7])
+
+        """
+        target_conn = sqlite3.connect(target)
+        # source tables are attached, so rows are copied inside sqlite
+        target_conn.execute("ATTACH DATABASE ? AS source", (self.filename,))
+        with target_conn:
+            for statement in CHANGES_TABLES:
+                target_conn.execute(statement)
+            target_conn.execute("CREATE TEMP TABLE wanted(personID INTEGER PRIMARY KEY)")
+            target_conn.executemany("INSERT INTO wanted VALUES (?)", ((person_id,) for person_id in person_ids))
+            target_conn.executemany("INSERT INTO deleted_records VALUES (?)",
+                                    ((person_id,) for person_id in deleted_ids))
+            target_conn.execute("INSERT INTO passw_table SELECT * FROM source.passw_table "
+                                "WHERE personID IN (SELECT personID FROM wanted)")
+            copied = target_conn.execute("SELECT changes()").fetchone()[0]
+            target_conn.execute("INSERT INTO key_table SELECT * FROM source.key_table "
+                                "WHERE personID IN (SELECT personID FROM wanted)")
+        target_conn.execute("DETACH DATABASE source")
+        target_conn.close()
+        return copied
+
+    def apply_record_changes(self, source):
+        """
+        Replays a file written by write_record_changes() onto this
+        database in one transaction. Deleted records are removed and
+        every record in the file replaces the one with the same id.
+        Returns the number of records written.
+
+        Args taken:
+        -source (str, file name)
+
+        Usage example:
+        >>> manage_db = DBManager("restored.db")
+        >>> manage_db.apply_record_changes("changes.db")
+
+        """
+        with self.write_lock:
+            self.conn.commit()  # can't attach inside a transaction
+            self.cur.execute("ATTACH DATABASE ? AS changes", (source,))
+            try:
+                with self.conn:
+                    replaced = ("SELECT personID FROM changes.deleted_records "
+                                "UNION SELECT personID FROM changes.passw_table")
+                    self.cur.execute("DELETE FROM key_table WHERE personID IN (%s)" % replaced)
+                    self.cur.execute("DELETE FROM passw_table WHERE personID IN (%s)" % replaced)
+                    self.cur.execute("INSERT INTO passw_table SELECT * FROM changes.passw_table")
+                    written = self.cur.rowcount
+                    self.cur.execute("INSERT INTO key_table SELECT * FROM changes.key_table")
+            finally:
+                self.cur.execute("DETACH DATABASE changes")
+        return written
+
     def read_all_from_db(self):
         """
         Reads all records from both databases.
         Returns records from each in two separate
-        lists of tuples.
+        lists of tuples, ordered by personID.
 
         No args taken.
 
@@ -225,18 +1096,122 @@ class DBManager:
         >>> manage_db.read_all_from_db()
 
         """
-        databox = []
-        keybox = []
-        all_records = self.cur.execute("SELECT * FROM passw_table")
-        databox = self.append_to_list(databox, all_records)
-        all_keys = self.cur.execute("SELECT * FROM key_table")
-        self.append_to_list(keybox, all_keys)
-        if all_keys is None:
-            keybox = []
-        else:
-            keybox = self.append_to_list(keybox, all_keys)
+        # ordered by id so both lists line up (rows are unique, no duplicates to remove)
+        databox = self.cur.execute("SELECT * FROM passw_table ORDER BY personID").fetchall()
+        keybox = self.cur.execute("SELECT * FROM key_table ORDER BY personID").fetchall()
         return databox, keybox
 
+    def iter_all_from_db(self, chunk_size=FETCH_CHUNK_SIZE):
+        """
+        Generator version of read_all_from_db(). Records and their keys
+        are joined on personID and read in personID order through a
+        single cursor, "chunk_size" rows at a time, and yielded one at a
+        time as
+        (personID, site, username, password, sitekey, usernamekey, passwordkey).
+        Keys are None for records without any. Use find_orphans() to
+        check for records and keys that don't match up.
+
+        Args taken:
+        -chunk_size=FETCH_CHUNK_SIZE (int)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> for row in manage_db.iter_all_from_db():
+        >>>     print(row[0])
+
+        """
+        for rows in self.iter_chunks_from_db(chunk_size):
+            for row in rows:
+                yield row
+
+    def iter_chunks_from_db(self, chunk_size=FETCH_CHUNK_SIZE):
+        """
+        Same as iter_all_from_db(), but yields each chunk of up to
+        "chunk_size" rows as a list, for callers that hand whole chunks
+        to worker processes.
+
+        Args taken:
+        -chunk_size=FETCH_CHUNK_SIZE (int)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> for rows in manage_db.iter_chunks_from_db(1000):
+        >>>     print(len(rows))
+
+        """
+        cursor = self.conn.cursor()  # own cursor, so self.cur can still be used while streaming
+        cursor.execute(RECORD_QUERY + " ORDER BY personID")  # rowid order, no sorting needed
+        try:
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                yield rows
+                rows = cursor.fetchmany(chunk_size)
+        finally:
+            cursor.close()
+
+    def read_record(self, person_id):
+        """
+        Reads one record and its keys, in the same form as
+        iter_all_from_db(). Returns None if there is no such record.
+
+        Args taken:
+        -person_id (int)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> row = manage_db.read_record(12)
+
+        """
+        return self.cur.execute(RECORD_QUERY + " WHERE personID = ?", (person_id,)).fetchone()
+
+    def find_orphans(self):
+        """
+        Finds records and keys that don't match up: encrypted records
+        with no keys (if there are any keys at all, otherwise records
+        are unencrypted), and keys with no record. Returns two lists of
+        personIDs.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> orphan_records, orphan_keys = manage_db.find_orphans()
+
+        """
+        orphan_keys = [row[0] for row in self.cur.execute(ORPHAN_KEYS_QUERY)]
+        orphan_records = []
+        if self.cur.execute("SELECT EXISTS (SELECT 1 FROM key_table)").fetchone()[0]:
+            orphan_records = [row[0] for row in self.cur.execute(ORPHAN_RECORDS_QUERY)]
+        return orphan_records, orphan_keys
+
+    def iter_table(self, table, chunk_size=FETCH_CHUNK_SIZE):
+        """
+        Yields every row of a table, "chunk_size" rows at a time. 'table'
+        should be "key_table", "passw_table", or "log_table".
+
+        Args taken:
+        -table (str - sqlite3 table)
+        -chunk_size=FETCH_CHUNK_SIZE (int)
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> for row in manage_db.iter_table("passw_table"):
+        >>>     print(row)
+
+        """
+        if table not in ("passw_table", "key_table", "log_table"):
+            raise ValueError("Unknown table: %s" % table)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT * FROM %s" % table)
+        try:
+            rows = cursor.fetchmany(chunk_size)
+            while rows:
+                for row in rows:
+                    yield row
+                rows = cursor.fetchmany(chunk_size)
+        finally:
+            cursor.close()
+
     def clear_db(self, table):
         """
         Clears all records from a given databases. 'table' should be
@@ -250,22 +1225,23 @@ class DBManager:
         >>> manage_db.clear_db("key_table")
 
         """
-        if table == "passw_table":
-            self.cur.execute("DELETE FROM passw_table")
-            self.conn.commit()
-            self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name='passw_table'")
-            # clears indexes so records always start from 1 (above)
-            self.conn.commit()
-        elif table == "key_table":
-            self.cur.execute("DELETE FROM key_table")
-            self.conn.commit()
-            self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name='key_table'")
-            self.conn.commit()
-        elif table == "log_table":
-            self.cur.execute("DELETE FROM log_table")
-            self.conn.commit()
-            self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name='log_table'")
-            self.conn.commit()
+        with self.write_lock:
+            if table == "passw_table":
+                self.cur.execute("DELETE FROM passw_table")
+                self.conn.commit()
+                self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name='passw_table'")
+                # clears indexes so records always start from 1 (above)
+                self.conn.commit()
+            elif table == "key_table":
+                self.cur.execute("DELETE FROM key_table")
+                self.conn.commit()
+                self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name='key_table'")
+                self.conn.commit()
+            elif table == "log_table":
+                self.cur.execute("DELETE FROM log_table")
+                self.conn.commit()
+                self.cur.execute("DELETE FROM SQLITE_SEQUENCE WHERE name='log_table'")
+                self.conn.commit()
 
     def check_db(self):
         """
@@ -290,13 +1266,66 @@ class DBManager:
             go_ahead = 2
         return go_ahead, databox, keybox
 
-    def export_plain_db(self, record_dict, filename):
+    def check_db_counts(self):
+        """
+        Same check as check_db(), but only counts the records rather
+        than reading them. Returns go_ahead along with the number of
+        records and keys, for use before streaming.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager()
+        >>> go_ahead, data_count, key_count = manage_db.check_db_counts()
+
+        """
+        data_count = self.cur.execute("SELECT COUNT(*) FROM passw_table").fetchone()[0]
+        key_count = self.cur.execute("SELECT COUNT(*) FROM key_table").fetchone()[0]
+        if data_count == 0 and key_count != 0:
+            go_ahead = 0
+        elif data_count != 0 and key_count != 0:
+            go_ahead = 1
+        else:
+            go_ahead = 2
+        return go_ahead, data_count, key_count
+
+    def check_integrity(self):
+        """
+        Checks a database before it's trusted, such as a restored
+        backup: sqlite's integrity check, then that keys and records
+        pair up. Returns a list of the problems found, empty if there
+        are none.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_db = DBManager("restored.db")
+        >>> problems = manage_db.check_integrity()
+
+        """
+        problems = [row[0] for row in self.cur.execute("PRAGMA integrity_check") if row[0] != "ok"]
+        if problems:
+            return problems  # tables can't be trusted to be read
+        go_ahead, data_count, key_count = self.check_db_counts()
+        if go_ahead == 0:
+            problems.append("passw_table is empty, but key_table has %d keys" % key_count)
+        elif go_ahead == 1:
+            orphan_records, orphan_keys = self.find_orphans()
+            if orphan_records:
+                problems.append("%d records have no keys (first id %d)" % (len(orphan_records), orphan_records[0]))
+            if orphan_keys:
+                problems.append("%d keys have no records (first id %d)" % (len(orphan_keys), orphan_keys[0]))
+        return problems
+
+    def export_plain_db(self, records, filename):
         """
         Decrypts the password database and exports the
-        records to a new database.
+        records to a new database. "records" can be the record
+        dictionary or any iterable of (site, username, password),
+        such as RecordManager.iter_decryption().
 
         Args taken:
-        -record_dict
+        -records (dictionary or iterable)
         -filename
 
         Usage:
@@ -304,27 +1333,29 @@ class DBManager:
         >>> dictionary = {1: ("Google", "example@gmail.com", "password")}
         >>> db_manager.export_plain_db(dictionary, "output.db")
         """
+        if isinstance(records, dict):
+            records = records.values()
         conn_export = sqlite3.connect(filename)  # new database is created
         cur_export = conn_export.cursor()
         cur_export.execute("CREATE TABLE IF NOT EXISTS passw_table(personID INTEGER PRIMARY KEY AUTOINCREMENT, "
                            "site STR, username STR, password STR)")
-        for item in record_dict:
-            site = record_dict[item][0]
-            username = record_dict[item][1]
-            password = record_dict[item][2]
-            cur_export.execute("INSERT INTO passw_table (site, username, password) VALUES (?,?,?)", (site, username,
-                                                                                                     password))
-            conn_export.commit()
+        cur_export.executemany("INSERT INTO passw_table (site, username, password) VALUES (?,?,?)",
+                               ((record[0], record[1], record[2]) for record in records))
+        conn_export.commit()
+        conn_export.close()
 
     @staticmethod
-    def append_to_list(box, param):
+    def append_to_list(box, param, dedupe=False):
         """
         Takes retrieved records from a database and appends them to a
-        list, in multidimentional form.
+        list, in multidimentional form. Runs in linear time. Set
+        "dedupe" to True to skip rows that are already in the list or
+        were fetched earlier, checked with a set.
 
         Args taken:
         -box
         -param
+        -dedupe=False (boolean)
 
         Usage example:
         >>> manage_db = DBManager()
@@ -334,8 +1365,286 @@ class DBManager:
         >>> box = manage_db.append_to_list(box, p)
 
         """
-        items = param.fetchall()  # param is the values retrieved from the database
-        for item in items:
-            if item not in box:
+        # param is the values retrieved from the database
+        if not dedupe:
+            box.extend(param)  # rows go straight from the cursor into the list
+            return box  # box can be any list given to the function
+        seen = set(box)
+        for item in param:
+            if item not in seen:
+                seen.add(item)
                 box.append(item)
-        return box  # box can be any list given to the function
+        return box
+
+
+class LogWriter:
+    """
+    Buffers login records in memory and writes them to log_table in
+    batches, so a burst of login attempts doesn't cost a transaction
+    each on the UI thread. A background thread flushes the buffer once
+    it holds "flush_size" records, every "interval" seconds, and when
+    the program exits (close() is registered with atexit).
+
+    Args taken:
+    -db_manager (DBManager)
+    -flush_size=LOG_FLUSH_SIZE (int)
+    -interval=LOG_FLUSH_INTERVAL (float)
+
+    Methods:
+    -write(self, date, user, success)
+    -flush(self)
+    -close(self)
+    -stats(self)
+
+    Usage example:
+    >>> log_writer = LogWriter(DBManager())
+    >>> log_writer.write("2017-11-02 18:17:54", "admin", "Failed")
+    >>> log_writer.stats()["queue_depth"]
+    1
+    >>> log_writer.close()
+
+    """
+
+    def __init__(self, db_manager, flush_size=LOG_FLUSH_SIZE, interval=LOG_FLUSH_INTERVAL):
+        self.db_manager = db_manager
+        self.flush_size = flush_size
+        self.interval = interval
+        self._queue = collections.deque()  # appends and pops are thread-safe
+        self._flush_lock = threading.Lock()
+        self._stop_lock = threading.Lock()  # a record is either buffered before close() or written straight away
+        self._wake = threading.Event()
+        self._stopped = False
+        # monitoring, see stats()
+        self.flushes = 0
+        self.rows_written = 0
+        self.max_queue_depth = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.last_error = None
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, date, user, success):
+        """
+        Buffers one login record. Returns straight away, the record is
+        written by the next flush.
+
+        Args taken:
+        -date (str)
+        -user (str)
+        -success (str)
+
+        Usage example:
+        >>> log_writer.write("2017-11-02 18:17:54", "admin", "Failed")
+
+        """
+        with self._stop_lock:
+            if not self._stopped:
+                self._queue.append((date, user, success))
+                depth = len(self._queue)
+                self.max_queue_depth = max(self.max_queue_depth, depth)
+                if depth >= self.flush_size:
+                    self._wake.set()
+                return
+        self.db_manager.write_to_log(date, user, success)  # nothing left to flush it, written straight away
+
+    def flush(self):
+        """
+        Writes every buffered record in one transaction. If the write
+        fails the records are put back to be tried again. Returns the
+        number of records written.
+
+        No args taken.
+
+        Usage example:
+        >>> log_writer.flush()
+        3
+
+        """
+        with self._flush_lock:
+            rows = []
+            while self._queue:
+                rows.append(self._queue.popleft())
+            if not rows:
+                return 0
+            start = time.perf_counter()
+            try:
+                self.db_manager.write_log_bulk(rows)
+            except sqlite3.Error as error:
+                self._queue.extendleft(reversed(rows))  # back at the front, in order
+                self.last_error = error
+                raise
+            latency = time.perf_counter() - start
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            return len(rows)
+
+    def close(self):
+        """
+        Stops the background thread and flushes anything left. Records
+        written afterwards go straight to the database.
+
+        No args taken.
+
+        Usage example:
+        >>> log_writer.close()
+
+        """
+        with self._stop_lock:  # write() checks under the same lock, so nothing is buffered after the last flush
+            stopping = not self._stopped
+            self._stopped = True
+        if stopping:
+            self._wake.set()
+            self._thread.join()
+        self.flush()
+
+    def stats(self):
+        """
+        Returns a dictionary of figures for monitoring the writer: the
+        number of buffered records, the most there have been, flush
+        count, records written, last and worst flush latency (seconds)
+        and the last error.
+
+        No args taken.
+
+        Usage example:
+        >>> log_writer.stats()
+        {'queue_depth': 0, 'max_queue_depth': 50, 'flushes': 12, 'rows_written': 421, ...}
+
+        """
+        return {"queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "last_flush_latency": self.last_flush_latency,
+                "max_flush_latency": self.max_flush_latency,
+                "last_error": self.last_error}
+
+    def _run(self):
+        """
+        Private method - background thread, flushes whenever it's woken
+        by write() or the interval passes.
+
+        Can only be called by other methods in class/instance.
+        """
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass  # records were put back, kept in last_error and tried again next time
+
+
+class DBExecutor:
+    """
+    Runs DBManager operations on one dedicated thread, so Tk callbacks
+    don't wait on the database. Operations run one at a time in the
+    order they were submitted, on the thread's own connection. Every
+    DBManager method can be called on a DBExecutor, and returns a
+    concurrent.futures.Future of its result straight away. Use
+    when_done() to get the result back on the Tk thread, or await
+    run() from asyncio code.
+
+    Args taken:
+    -db_manager (DBManager)
+
+    Methods:
+    -submit(self, function, *args, **kwargs)
+    -run(self, function, *args, **kwargs) [COROUTINE]
+    -close(self)
+
+    Usage example:
+    >>> db_executor = DBExecutor(DBManager())
+    >>> future = db_executor.read_log_page(None, 20)
+    >>> when_done(menu, future, print)
+    >>> records = await db_executor.run(db_executor.db_manager.read_log_page, None, 20)
+
+    """
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="DBExecutor")  # started on first use
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        method = getattr(self.db_manager, name)  # AttributeError for anything DBManager doesn't have
+        return lambda *args, **kwargs: self.submit(method, *args, **kwargs)
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Runs function(*args, **kwargs) on the database thread, after
+        everything submitted before it. Returns a Future of its result.
+
+        Args taken:
+        -function
+        -*args, **kwargs (passed to function)
+
+        Usage example:
+        >>> db_executor = DBExecutor(DBManager())
+        >>> future = db_executor.submit(csv_file.write_rows, records, "UTF-8")
+
+        """
+        return self._executor.submit(function, *args, **kwargs)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Coroutine version of submit(), for asyncio code. Returns the
+        result of function(*args, **kwargs).
+
+        Args taken:
+        -function
+        -*args, **kwargs (passed to function)
+
+        Usage example:
+        >>> db_executor = DBExecutor(DBManager())
+        >>> count = await db_executor.run(db_executor.db_manager.count_log)
+
+        """
+        return await asyncio.wrap_future(self.submit(function, *args, **kwargs))
+
+    def close(self):
+        """
+        Waits for submitted operations to finish and stops the thread.
+        Called when the program exits.
+
+        No args taken.
+        """
+        self._executor.shutdown(wait=True)
+
+
+def when_done(widget, future, callback, errback=None, interval=FUTURE_POLL_INTERVAL):
+    """
+    Calls callback(result) on the Tk thread once "future" is done,
+    checking every "interval" milliseconds with widget.after(), since
+    Tk can only be used from its own thread. If the operation raised an
+    exception, errback(exception) is called instead, or an error box
+    is shown over the widget if there's no errback. Nothing is called
+    if the widget is destroyed first.
+
+    Args taken:
+    -widget (Tk widget)
+    -future (concurrent.futures.Future)
+    -callback (function)
+    -errback=None (function)
+    -interval=FUTURE_POLL_INTERVAL (int)
+
+    Usage example:
+    >>> when_done(menu, db_executor.count_log(), lambda count: print(count, "login records"))
+    """
+    if not future.done():
+        try:
+            widget.after(interval, lambda: when_done(widget, future, callback, errback, interval))
+        except TclError:
+            pass  # widget destroyed, nothing left to show the result in
+        return
+    error = future.exception()
+    if error is None:
+        callback(future.result())
+    elif errback is not None:
+        errback(error)
+    else:
+        mb.showerror(ERROR_BOX_TITLE, "Error: %s" % error, parent=widget)
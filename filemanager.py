@@ -167,6 +167,7 @@ class CSVFile(FileManager):
     Functions:
     -read_file(self, encoding)
     -write_file(self, content, encoding)
+    -write_rows(self, rows, encoding)
     -clear_file(self)
 
     Usage:
@@ -220,6 +221,24 @@ class CSVFile(FileManager):
             writer.writerow(content)
             csvfile.close()
 
+    def write_rows(self, rows, encoding):
+        """
+        Writes many rows to a CSV file, opening it only once. "rows" can
+        be any iterable, including a generator.
+
+        Args taken:
+        -rows (iterable of lists/tuples)
+        -encoding (str)
+
+        Usage example:
+        >>>file = CSVFile("passwords.csv")
+        >>>file.write_rows(record_dict.values(), None)
+        """
+        with open(self.filename, 'a') as csvfile:
+            writer = csv.writer(csvfile, delimiter=",", quotechar='|', quoting=csv.QUOTE_MINIMAL)
+            writer.writerows(rows)
+            csvfile.close()
+
     def clear_file(self):
         """
         Clears a CSV file.
@@ -247,6 +266,7 @@ class ZipFile(FileManager):
     Functions:
     -read_file(self, encoding)
     -write_file(self, content, encoding)
+    -write_files(self, files, compression=zipfile.ZIP_DEFLATED)
 
     Usage:
 
@@ -290,6 +310,24 @@ class ZipFile(FileManager):
                 file.write(item)
             file.close()
 
+    def write_files(self, files: dict, compression=zipfile.ZIP_DEFLATED):
+        """
+        Compresses given files into a zip file under different names.
+        Files are streamed into the zip rather than read into memory.
+
+        Args taken:
+        -files: dict (names in the zip file to the files written under them)
+        -compression=zipfile.ZIP_DEFLATED
+
+        Usage:
+
+        >>>backupzip = ZipFile("testfile.zip")
+        >>>backupzip.write_files({"data/data.db": "/tmp/snapshot.db"})
+        """
+        with zipfile.ZipFile(self.filename, "w", compression) as file:
+            for name, path in files.items():
+                file.write(path, name)
+
 
 class INIFile(FileManager):
     """
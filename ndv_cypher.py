@@ -4,12 +4,34 @@ Module containing classes for encryption.
 classes:
 -VermamEncrypt
 -VernamDecrypt
+-RandomPool
+-KeystreamCipher
+
+Keys are either the original space separated text ("3 -4 -10 2 0") or
+one of the binary formats, which start with a version byte:
+-KEY_FORMAT_INT8: one signed byte per shift, for ascii text
+-KEY_FORMAT_UTF8: one byte per shift (mod 256) of the UTF-8 encoded
+ text, so any character can be encrypted
+VernamDecrypt.decrypt() reads all of them.
+
+KeystreamCipher is an alternative to the vernam cypher that needs no
+stored keys: each field is XORed with a keystream derived from a master
+key, the record's id and a random nonce.
 
 Usage example:
 >>> encrypted_text, key = VernamEncrypt.encrypt("sample text")
 """
 
-import random
+import hashlib
+import operator
+import os
+import threading
+from array import array
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, pure python fallback is used without it
+    numpy = None
 
 """
 !/usr/bin/env python
@@ -34,6 +56,22 @@ __copyright__ = "Copyright (C) 2017 Nicholas De Villiers"
 __license__ = "Public Domain"
 __version__ = "1.0"
 
+# version byte at the start of every binary key
+KEY_FORMAT_INT8 = 1
+KEY_FORMAT_UTF8 = 2
+# first byte of every KeystreamCipher ciphertext, marks a record that has no keys
+KEYSTREAM_FORMAT = 3
+NONCE_SIZE = 16
+MASTER_KEY_SIZE = 32
+
+# printable ascii except backslash, the only values a shifted character may take
+OUTPUT_CODES = bytes(code for code in range(32, 127) if code != 92)
+# random bytes map straight onto output codes. bytes past the last whole multiple of len(OUTPUT_CODES)
+# are thrown away so that every output code is equally likely
+_CODE_TABLE = bytes(OUTPUT_CODES[byte % len(OUTPUT_CODES)] for byte in range(256))
+_REJECTED_BYTES = bytes(range(len(OUTPUT_CODES) * (256 // len(OUTPUT_CODES)), 256))
+DEFAULT_POOL_SIZE = 65536  # output codes drawn per refill of the random pool
+
 
 class VernamEncrypt:
     """
@@ -41,7 +79,10 @@ class VernamEncrypt:
 
     Methods:
     -encrypt(cls, text) [CLASS METHOD]
+    -encrypt_many(cls, texts, binary=False) [CLASS METHOD]
+    -pack_key(shifts, key_format=KEY_FORMAT_INT8) [STATIC METHOD]
     -_gen_char(val) [STATIC METHOD]
+    -_gen_chars(codes) [STATIC METHOD]
 
     Usage:
     >>> encrypted_text, key = VernamEncrypt.encrypt("sample text")
@@ -65,26 +106,82 @@ class VernamEncrypt:
         >>> encrypt = VernamEncrypt
         >>> encr_text, key = encrypt.encrypt("sample text")
         """
-        plain_ascii = []
-        key = []
-        encrypt_list = []
-        for char in text:
-            asc = ord(char)  # converts character to ascii value
-            asc = int(asc)  # converts ascii value to int
-            plain_ascii.append(asc)
-        for val in plain_ascii:
-            new_value, shift = cls._gen_char(val)  # returns shifted letter and key
-            # below: shifted char and key converted to string
-            new_value = str(new_value)
-            shift = str(shift)
-            # values appended to list
-            key.append(shift)
-            encrypt_list.append(new_value)
-        # lists converted to string
-        encr_text = str(("".join(encrypt_list)))
-        encr_key = (" ".join(key))
+        # shifts for the whole text are taken from the random pool in one slice
+        encr_text, encr_key = cls.encrypt_many([text])[0]
         return encr_text, encr_key  # ciphertext and key(s) returned as strings
 
+    @classmethod
+    def encrypt_many(cls, texts, binary=False):
+        """
+        Encrypts a list of texts in one go. All texts are joined into
+        one buffer so that every shift is drawn in a single bulk call,
+        rather than one call per character. Set "binary" to True to
+        get keys in the binary format (see pack_key()). In binary mode
+        texts are encrypted as UTF-8 bytes, so non-ascii texts get a
+        KEY_FORMAT_UTF8 key.
+
+        Args taken:
+        -texts (list of str)
+        -binary=False (boolean)
+
+        Returns a list of (encr_text, encr_key) tuples, in the same
+        order and format as encrypt() would return them.
+
+        Usage:
+
+        >>> encrypt = VernamEncrypt
+        >>> results = encrypt.encrypt_many(["Google", "johndoe1@gmail.com", "jhAS/123!"])
+        >>> encr_text, key = results[0]
+        """
+        texts = [str(text) for text in texts]
+        if binary:
+            encoded = [text.encode("utf-8") for text in texts]
+            codes = b"".join(encoded)  # one contiguous buffer for every field
+        else:
+            encoded = texts
+            joined = "".join(texts)
+            try:
+                codes = joined.encode("ascii")
+            except UnicodeEncodeError:
+                codes = array("l", map(ord, joined))
+        cipher_codes, shifts = cls._gen_chars(codes)
+        cipher = cipher_codes.decode("ascii")
+        results = []
+        start = 0
+        for x in range(len(texts)):
+            end = start + len(encoded[x])
+            # buffer is split back into separate fields
+            if not binary:
+                encr_key = " ".join(map(str, shifts[start:end]))
+            elif len(encoded[x]) == len(texts[x]):  # one byte per character means the text is ascii
+                encr_key = cls.pack_key(shifts[start:end])
+            else:
+                encr_key = cls.pack_key(shifts[start:end], KEY_FORMAT_UTF8)
+            results.append((cipher[start:end], encr_key))
+            start = end
+        return results
+
+    @staticmethod
+    def pack_key(shifts, key_format=KEY_FORMAT_INT8):
+        """
+        Packs a list of shifts into a binary key: one version byte
+        followed by one byte per shift. KEY_FORMAT_INT8 stores signed
+        bytes, KEY_FORMAT_UTF8 stores shifts of UTF-8 bytes mod 256.
+
+        Args taken:
+        -shifts (list of int)
+        -key_format=KEY_FORMAT_INT8 (int)
+
+        Returns key (bytes). Raises OverflowError if a shift doesn't
+        fit in a signed byte for KEY_FORMAT_INT8.
+
+        Usage:
+        >>> key = VernamEncrypt.pack_key([3, -4, -10, 2, 0])
+        """
+        if key_format == KEY_FORMAT_UTF8:
+            return bytes((KEY_FORMAT_UTF8,)) + bytes([shift & 0xFF for shift in shifts])
+        return bytes((KEY_FORMAT_INT8,)) + array("b", shifts).tobytes()
+
     @staticmethod
     def _gen_char(val):
         """
@@ -96,16 +193,30 @@ class VernamEncrypt:
 
         Can only be called by other methods in class/instance.
         """
-        shift = 0
-        new_value = ""
-        valid = False
-        while not valid:
-            shift = random.randint((0 - val), (127 - val))  # shift is random
-            new_value = chr(val + shift)
-            if 32 <= ord(new_value) < 127 and ord(new_value) != 92:  # ensures that all new values are actual chars
-                valid = True
+        shift = random_pool.take(1)[0] - val  # output character comes from the pool, shift worked out from it
+        new_value = chr(val + shift)
         return new_value, shift
 
+    @staticmethod
+    def _gen_chars(codes):
+        """
+        Private method - shifts a whole buffer of characters at once.
+
+        Args taken: codes (bytes or array of ascii values)
+
+        Returns cipher_codes (bytes) and shifts (list of int).
+
+        Can only be called by other methods in class/instance.
+        """
+        cipher = random_pool.take(len(codes))  # output characters for the whole buffer in one slice
+        if numpy is not None:
+            if isinstance(codes, bytes):
+                plain = numpy.frombuffer(codes, dtype=numpy.uint8).astype(numpy.int32)
+            else:
+                plain = numpy.array(codes, dtype=numpy.int32)
+            return cipher, (numpy.frombuffer(cipher, dtype=numpy.uint8) - plain).tolist()
+        return cipher, list(map(operator.sub, cipher, codes))
+
 
 class VernamDecrypt:
     """
@@ -113,6 +224,9 @@ class VernamDecrypt:
 
     Methods:
     -decrypt(cipher, keytext) [CLASS METHOD]
+    -unpack_key(keytext) [STATIC METHOD]
+    -key_format(keytext) [STATIC METHOD]
+    -_decrypt_utf8(cipher, key) [STATIC METHOD]
     -__use_input(cipher) [STATIC METHOD]
 
     Usage:
@@ -146,7 +260,7 @@ class VernamDecrypt:
 
         Args taken:
         -cipher (str)
-        -keytext (str)
+        -keytext (str or bytes)
 
         Returns plain_text(str).
 
@@ -155,13 +269,286 @@ class VernamDecrypt:
         >>> cipher = VernamDecrypt
         >>> text = cipher.decrypt("kabno", "3 -4 -10 2 0")
         """
+        if cls.key_format(keytext) == KEY_FORMAT_UTF8:
+            return cls._decrypt_utf8(cipher, memoryview(keytext)[1:])
         cipher_list = cls._user_input(cipher)
-        plain_list = []
-        key = str(keytext).split()  # splits key string into list values
-        for x in range(0, len(key)):
-            new_val = chr(int(cipher_list[x]) - int(key[x]))  # shift is reversed
-            plain_list.append(new_val)  # reverse shifted values added to list
-        plain_text = "".join(plain_list)  # decrypted characters joined as a string
+        key = cls.unpack_key(keytext)
+        # shift is reversed for every character, decrypted characters joined as a string
+        plain_text = "".join(map(chr, map(operator.sub, cipher_list[:len(key)], key)))
         cipher_list.clear()
-        plain_list.clear()
         return plain_text
+
+    @staticmethod
+    def key_format(keytext):
+        """
+        Works out which format a key is stored in. Text keys are 0.
+
+        Args taken:
+        -keytext (str, int or bytes)
+
+        Returns key_format (int).
+
+        Usage:
+        >>> VernamDecrypt.key_format("3 -4 -10 2 0")
+        0
+        """
+        if isinstance(keytext, (bytes, bytearray, memoryview)) and len(keytext) > 0:
+            return keytext[0]
+        return 0
+
+    @staticmethod
+    def _decrypt_utf8(cipher, key):
+        """
+        Private method - reverses the shifts of a KEY_FORMAT_UTF8 key,
+        byte by byte, then decodes the UTF-8.
+
+        Args taken:
+        -cipher (str)
+        -key (bytes-like, without the version byte)
+
+        Returns plain_text (str).
+
+        Can only be called by other methods in class/instance.
+        """
+        cipher_bytes = cipher.encode("ascii")
+        if numpy is not None:
+            plain = (numpy.frombuffer(cipher_bytes, dtype=numpy.uint8) - numpy.frombuffer(key, dtype=numpy.uint8))
+            plain_bytes = plain.tobytes()  # uint8 arithmetic wraps around, same as mod 256
+        else:
+            plain_bytes = bytes([(c - k) & 0xFF for c, k in zip(cipher_bytes, key)])
+        return plain_bytes.decode("utf-8")
+
+    @staticmethod
+    def unpack_key(keytext):
+        """
+        Reads a text or KEY_FORMAT_INT8 key into its shifts. Binary keys
+        are read in place through a memoryview rather than being copied.
+
+        Args taken:
+        -keytext (str, int or bytes)
+
+        Returns key (sequence of int).
+
+        Usage:
+        >>> shifts = VernamDecrypt.unpack_key("3 -4 -10 2 0")
+        >>> shifts = VernamDecrypt.unpack_key(b"\\x01\\x03\\xfc\\xf6\\x02\\x00")
+        """
+        if isinstance(keytext, (bytes, bytearray, memoryview)):
+            view = memoryview(keytext)
+            if len(view) == 0 or view[0] != KEY_FORMAT_INT8:
+                raise ValueError("Unknown key format.")
+            return view[1:].cast("b")  # version byte skipped, rest read as signed bytes
+        return [int(x) for x in str(keytext).split()]  # splits key string into list values
+
+
+class RandomPool:
+    """
+    Class holding a buffer of random output codes for the cypher.
+    Randomness is drawn in large blocks and handed out in slices, so
+    encrypting a character doesn't need its own call to the random
+    number generator.
+
+    Args taken:
+    -pool_size=DEFAULT_POOL_SIZE (int - codes drawn per refill)
+    -source=os.urandom (function taking a length and returning random bytes)
+
+    Methods:
+    -take(self, num_of_codes)
+    -_refill(self, needed)
+
+    Usage:
+    >>> pool = RandomPool(pool_size=1 << 20)
+    >>> codes = pool.take(12)
+    >>> numpy_pool = RandomPool(source=numpy.random.default_rng().bytes)
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, source=os.urandom):
+        self.pool_size = pool_size
+        self.source = source
+        self._buffer = b""
+        self._position = 0
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def take(self, num_of_codes):
+        """
+        Takes the next codes from the pool, refilling it if needed.
+
+        Args taken:
+        -num_of_codes (int)
+
+        Returns codes (bytes of values from OUTPUT_CODES).
+
+        Usage:
+        >>> codes = random_pool.take(12)
+        """
+        with self._lock:
+            if self._pid != os.getpid():  # worker processes must never reuse randomness copied from the parent
+                self._buffer = b""
+                self._position = 0
+                self._pid = os.getpid()
+            if len(self._buffer) - self._position < num_of_codes:
+                self._refill(num_of_codes)
+            codes = self._buffer[self._position:self._position + num_of_codes]
+            self._position += num_of_codes
+        return codes
+
+    def _refill(self, needed):
+        """
+        Private method - tops the pool up to at least pool_size codes,
+        or "needed" codes if that is more.
+
+        Args taken:
+        -needed (int)
+
+        Can only be called by other methods in class/instance.
+        """
+        chunks = [self._buffer[self._position:]]
+        available = len(chunks[0])
+        target = max(self.pool_size, needed)
+        while available < target:
+            # about 27% of random bytes are rejected, so a little extra is drawn
+            raw = self.source((target - available) * 4 // 3 + 16)
+            codes = raw.translate(_CODE_TABLE, _REJECTED_BYTES)
+            chunks.append(codes)
+            available += len(codes)
+        self._buffer = b"".join(chunks)
+        self._position = 0
+
+
+random_pool = RandomPool()  # shared by VernamEncrypt
+
+
+class KeystreamCipher:
+    """
+    Class for encryption without stored keys. Each field is XORed with
+    a keystream from BLAKE2b in counter mode, keyed with a master key
+    and bound to the record id, the field and a random nonce. Any
+    block of the keystream can be worked out on its own, so decrypting
+    a record only ever needs that record's row.
+
+    Ciphertext layout (bytes): KEYSTREAM_FORMAT, nonce, XORed UTF-8 text.
+
+    Methods:
+    -generate_master_key() [STATIC METHOD]
+    -encrypt(cls, text, master_key, record_id, field) [CLASS METHOD]
+    -decrypt(cls, cipher, master_key, record_id, field) [CLASS METHOD]
+    -keystream(master_key, nonce, record_id, field, length, offset=0) [STATIC METHOD]
+    -is_keystream(cipher) [STATIC METHOD]
+
+    Usage:
+    >>> master_key = KeystreamCipher.generate_master_key()
+    >>> cipher = KeystreamCipher.encrypt("sample text", master_key, 1, 0)
+    >>> text = KeystreamCipher.decrypt(cipher, master_key, 1, 0)
+    """
+
+    BLOCK_SIZE = 64  # bytes of keystream per BLAKE2b call
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def generate_master_key():
+        """
+        Generates a new random master key.
+
+        No args taken.
+
+        Returns master_key (bytes).
+
+        Usage:
+        >>> master_key = KeystreamCipher.generate_master_key()
+        """
+        return os.urandom(MASTER_KEY_SIZE)
+
+    @classmethod
+    def encrypt(cls, text, master_key, record_id, field):
+        """
+        Encrypts a field of a record.
+
+        Args taken:
+        -text (str)
+        -master_key (bytes)
+        -record_id (int)
+        -field (int - 0 site, 1 username, 2 password)
+
+        Returns cipher (bytes).
+
+        Usage:
+        >>> cipher = KeystreamCipher.encrypt("Google", master_key, 12, 0)
+        """
+        plain = str(text).encode("utf-8")
+        nonce = os.urandom(NONCE_SIZE)  # a new nonce every save, so a keystream is never reused
+        stream = cls.keystream(master_key, nonce, record_id, field, len(plain))
+        # XOR done on the whole field at once as big integers
+        xored = (int.from_bytes(plain, "little") ^ int.from_bytes(stream, "little")).to_bytes(len(plain), "little")
+        return bytes((KEYSTREAM_FORMAT,)) + nonce + xored
+
+    @classmethod
+    def decrypt(cls, cipher, master_key, record_id, field):
+        """
+        Decrypts a field encrypted by encrypt(). The record id and
+        field must be the same as when it was encrypted.
+
+        Args taken:
+        -cipher (bytes)
+        -master_key (bytes)
+        -record_id (int)
+        -field (int)
+
+        Returns plain_text (str).
+
+        Usage:
+        >>> text = KeystreamCipher.decrypt(cipher, master_key, 12, 0)
+        """
+        if not cls.is_keystream(cipher):
+            raise ValueError("Not a keystream ciphertext.")
+        nonce = bytes(cipher[1:NONCE_SIZE + 1])
+        xored = bytes(cipher[NONCE_SIZE + 1:])
+        stream = cls.keystream(master_key, nonce, record_id, field, len(xored))
+        plain = (int.from_bytes(xored, "little") ^ int.from_bytes(stream, "little")).to_bytes(len(xored), "little")
+        return plain.decode("utf-8")
+
+    @staticmethod
+    def keystream(master_key, nonce, record_id, field, length, offset=0):
+        """
+        Works out "length" bytes of keystream starting at "offset",
+        without generating anything before the block "offset" is in.
+
+        Args taken:
+        -master_key (bytes)
+        -nonce (bytes)
+        -record_id (int)
+        -field (int)
+        -length (int)
+        -offset=0 (int)
+
+        Returns stream (bytes).
+
+        Usage:
+        >>> stream = KeystreamCipher.keystream(master_key, nonce, 12, 0, 32)
+        """
+        block_size = KeystreamCipher.BLOCK_SIZE
+        prefix = nonce + record_id.to_bytes(8, "big") + field.to_bytes(1, "big")
+        blocks = []
+        for counter in range(offset // block_size, (offset + length + block_size - 1) // block_size):
+            block = hashlib.blake2b(prefix + counter.to_bytes(8, "big"), key=master_key, digest_size=block_size)
+            blocks.append(block.digest())
+        start = offset % block_size
+        return b"".join(blocks)[start:start + length]
+
+    @staticmethod
+    def is_keystream(cipher):
+        """
+        Checks whether a stored value was encrypted by KeystreamCipher.
+
+        Args taken:
+        -cipher (str or bytes)
+
+        Returns is_keystream (boolean).
+
+        Usage:
+        >>> KeystreamCipher.is_keystream(b"\\x03...")
+        """
+        return isinstance(cipher, (bytes, bytearray, memoryview)) and len(cipher) > NONCE_SIZE and \
+            cipher[0] == KEYSTREAM_FORMAT
@@ -13,9 +13,20 @@ Usage:
 """
 
 
+import collections
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from tkinter import *
 from tkinter import filedialog as fd
 from tkinter import messagebox as mb
+from tkinter import ttk
 
 import dbmanager
 import ndv_cypher
@@ -43,20 +54,119 @@ along with this program; if not, see <http://www.gnu.org/licenses/>.
 INFO_BOX_TITLE = "Information"
 ERROR_BOX_TITLE = "Error"
 WARNING_TITLE = "Warning"
+PARALLEL_MIN_RECORDS = 5000  # smaller vaults are quicker without the cost of starting processes
+PARALLEL_CHUNK_SIZE = 2000  # records handed to a worker process at a time
+MASTER_KEY_FILE = "data/master.key"  # only exists while the vault uses the keystream cipher
+BACKUP_POLL_INTERVAL = 100  # milliseconds between checks on a backup or import running in the background
+BACKUP_MANIFEST = "manifest.json"  # describes the backup chain in a backup directory
+BACKUP_BASE = "base.zip"  # full backup the chain starts from
+BACKUP_CHANGES = "changes_%04d.zip"  # records changed since the backup before, numbered in order
+BACKUP_CHANGES_DB = "changes.db"  # file written by DBManager.write_record_changes() inside each changes zip
+RESTORE_FILES = "restore.json"  # where stage_restore() lists the staged files and where they go
+
+
+def _encrypt_records(rows, master_key=None):
+    """
+    Encrypts (record_id, site, username, password) rows. Uses the
+    keystream cipher if a master key is given, otherwise the vernam
+    cypher with binary keys. Kept at module level so it can be sent to
+    worker processes.
+
+    Args taken:
+    -rows (list of tuples)
+    -master_key=None (bytes)
+
+    Returns a list of encrypted (site, username, password) tuples and
+    a list of key tuples (None for every record in keystream mode).
+    """
+    records = []
+    keys = []
+    if master_key is not None:
+        for row in rows:
+            encr_list = []
+            for x in range(1, 4):
+                encr_list.append(ndv_cypher.KeystreamCipher.encrypt(row[x], master_key, row[0], x - 1))
+            records.append((encr_list[0], encr_list[1], encr_list[2]))
+            keys.append(None)
+    else:
+        fields = []
+        for row in rows:
+            fields.extend(row[1:4])
+        encrypted = ndv_cypher.VernamEncrypt.encrypt_many(fields, binary=True)  # every field in one batch
+        for x in range(0, len(encrypted), 3):
+            site, username, password = encrypted[x:x + 3]
+            records.append((site[0], username[0], password[0]))  # tuple used to save space
+            keys.append((site[1], username[1], password[1]))
+    return records, keys
+
+
+def _decrypt_rows(rows, master_key=None):
+    """
+    Decrypts rows read by DBManager.iter_chunks_from_db(). Fields are
+    decrypted with the keystream cipher if they were written by it,
+    with the vernam cypher if they have a key, and returned as they
+    are otherwise. Kept at module level so it can be sent to worker
+    processes.
+
+    Args taken:
+    -rows (list of tuples)
+    -master_key=None (bytes)
+
+    Returns a list of (personID, site, username, password) tuples.
+    """
+    records = []
+    for row in rows:
+        decr_list = []
+        for x in range(1, 4):
+            if ndv_cypher.KeystreamCipher.is_keystream(row[x]):
+                if master_key is None:
+                    raise ValueError("Record %d can't be decrypted without the master key." % row[0])
+                decrypted = ndv_cypher.KeystreamCipher.decrypt(row[x], master_key, row[0], x - 1)
+            elif row[x + 3] is None:  # no key, field was never encrypted
+                decrypted = row[x]
+            else:
+                decrypted = ndv_cypher.VernamDecrypt.decrypt(str(row[x]), row[x + 3])
+            decr_list.append(decrypted)
+        records.append((row[0], decr_list[0], decr_list[1], decr_list[2]))
+    return records
 
 
 class RecordManager:
     """
     Class to manage all actions on records.
 
-    Does not take any arguments.
+    Optionally takes the database file, which is passed on to the
+    DBManager instantiated in __init__().
+
+    Encryption and decryption of large vaults is split across worker
+    processes if "worker processes" under [Preferences] in settings.ini
+    is more than 1. Vaults with fewer than PARALLEL_MIN_RECORDS records
+    always stay in this process.
+
+    Records are encrypted with the vernam cypher, or with the keystream
+    cipher (no key_table rows) if MASTER_KEY_FILE exists. Use
+    convert_to_keystream() and convert_to_vernam() to switch a vault.
 
-    Instantiates DBManager in __init__().
+    Saves and exports run on the db_executor thread (a
+    dbmanager.DBExecutor), one at a time in the order they were made,
+    so the window doesn't freeze while they're written.
 
     Functions:
     -write_encrypted(self, record_dict, preserve=False)
+    -save_changes(self, record_dict)
+    -submit_changes(self, record_dict, menu)
+    -_take_changes(self, record_dict)
+    -_write_changes(self, added, changed, deleted)
+    -_requeue_changes(self, record_dict, added, changed, deleted)
+    -clear_changes(self)
     -db_encryption(self, record_dict)
     -db_decryption(self)
+    -iter_decryption(self, chunk_size=dbmanager.FETCH_CHUNK_SIZE, with_ids=False)
+    -use_process_pool(self, num_of_records)
+    -read_record(self, person_id)
+    -count_records(self)
+    -convert_to_keystream(self, record_dict)
+    -convert_to_vernam(self, record_dict)
     -add_new_record(self, site_entry, un_entry, pw_entry, new, record_dict)
     -change_record(self, new_site_text, new_un_text, new_pw_text, edit, record_dict, index)
     -delete_record(self, edit, record_dict, index)
@@ -68,8 +178,23 @@ class RecordManager:
     -export_as_html(self, menu, record_dict)
     -export_as_json(self, menu, record_dict)
     -export_as_xml(self, menu, record_dict)
+    -_export(self, menu, job, message)
+    -write_backup(self, filename, progress=None)
+    -write_incremental_backup(self, directory, differential=False, progress=None)
+    -read_backup_manifest(directory) [STATIC]
+    -restore_backup_chain(self, directory, target)
+    -stage_restore(self, filename)
+    -decrypt_staged(self, staging, progress=None)
+    -_swap_staged(self, staging)
+    -_load_restored(self, record_dict, records)
     -create_backup(self, menu, record_dict)
-    -import_backup(self, menu, record_dict)
+    -create_incremental_backup(self, menu, record_dict, differential=False)
+    -_run_backup(self, menu, job)
+    -_take_snapshot(self, directory, progress=None)
+    -_zip_snapshot(self, filename, snapshot)
+    -_zip_name(path) [STATIC]
+    -import_backup(self, menu, record_dict, on_imported=None, on_failed=None)
+    -_wait_for_restore(self, menu, window, thread, state, record_dict, on_imported, on_failed)
 
     Usage example:
 
@@ -79,15 +204,32 @@ class RecordManager:
 
     """
 
-    def __init__(self):
-        self.db_manager = dbmanager.DBManager()
+    def __init__(self, db_file=dbmanager.DB_FILE):
+        self.db_manager = dbmanager.DBManager(db_file)
+        self.db_executor = dbmanager.DBExecutor(self.db_manager)  # saves and exports are written on its thread
         self.unsaved_changes = False  # this value changes throughout runtime
+        self.record_count = None  # cached by count_records()
+        # ids of records changed since the last save, written by save_changes()
+        self.added_ids = set()
+        self.changed_ids = set()
+        self.deleted_ids = set()
+        preferences = INIFile('data/settings.ini').read_file()["Preferences"]
+        self.workers = int(preferences.get("worker processes", "0") or 0)  # 0 or 1 means no worker processes
+        pool_size = preferences.get("random pool size", "")
+        if pool_size:
+            ndv_cypher.random_pool.pool_size = int(pool_size)
+        self.master_key = None  # set if the vault uses the keystream cipher
+        if os.path.exists(MASTER_KEY_FILE):
+            self.master_key = bytes.fromhex(TextFile(MASTER_KEY_FILE).read_file("utf-8").strip())
+        self.restored_records = None  # decrypted by import_backup(), handed out by the next create_dict()
 
     def write_encrypted(self, record_dict, preserve=False):
         """
         Writes encrypted records into the password database, and their
-        respective keys into the key database. Set "preserve" to True
-        to preserve the record dictionary when clearing the database.
+        respective keys into the key database, replacing everything in
+        them. Records keep their dictionary keys as ids. Set "preserve"
+        to True to preserve the record dictionary when clearing the
+        database. Use save_changes() to only write what has changed.
 
         Args taken:
         -record_dict (dictionary)
@@ -99,16 +241,12 @@ class RecordManager:
 
         """
         encr_records, keys = self.record_encryption(record_dict)
-        self.clear_records("both", False, record_dict, clear_dict=not preserve)  # all records are cleared from db
-        for x in range(len(encr_records)):
-            sitetext = encr_records[x][0]
-            untext = encr_records[x][1]
-            pwtext = encr_records[x][2]
-            self.db_manager.write_to_main(sitetext, untext, pwtext)
-            sitekey = keys[x][0]
-            unkey = keys[x][1]
-            pwkey = keys[x][2]
-            self.db_manager.write_to_keys(sitekey, unkey, pwkey)
+        # old records are replaced in the same transaction, so a failed save leaves the database as it was
+        self.db_manager.write_records_bulk(encr_records, keys, replace=True, person_ids=list(record_dict))
+        if not preserve:
+            record_dict.clear()
+        self.record_count = len(encr_records)
+        self.clear_changes()
 
     def record_encryption(self, record_dict):
         """
@@ -127,21 +265,126 @@ class RecordManager:
         records = []
         keys = []
         if record_dict:  # only does it if there are values
-            for record_id in record_dict:
-                encr_list = []
-                key_list = []
-                record = record_dict[record_id]
-                for x in record:  # one field of a record encrypted at a time
-                    encr_record, key = ndv_cypher.VernamEncrypt.encrypt(str(x))
-                    encr_list.append(encr_record)
-                    key_list.append(str(key))
-                encr_tuple = (str(encr_list[0]), str(encr_list[1]), str(encr_list[2]))  # tuple used to save space
-                key_tuple = (key_list[0], key_list[1], key_list[2])
-                # tuples appended to lists
-                records.append(encr_tuple)
-                keys.append(key_tuple)
+            # dictionary keys are the ids records are written under
+            rows = [(record_id,) + tuple(record) for record_id, record in record_dict.items()]
+            if self.use_process_pool(len(rows)):
+                chunks = [rows[x:x + PARALLEL_CHUNK_SIZE] for x in range(0, len(rows), PARALLEL_CHUNK_SIZE)]
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    # map keeps chunks in order
+                    for chunk_records, chunk_keys in pool.map(_encrypt_records, chunks,
+                                                              [self.master_key] * len(chunks)):
+                        records.extend(chunk_records)
+                        keys.extend(chunk_keys)
+            else:
+                records, keys = _encrypt_records(rows, self.master_key)
         return records, keys
 
+    def save_changes(self, record_dict):
+        """
+        Saves only the records added, changed or deleted since the last
+        save, in one transaction. Waits for the save, and any submitted
+        before it, to finish. Returns the number of records saved.
+
+        Args taken:
+        -record_dict (dictionary)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> record_dict = manage_records.create_dict()
+        >>> manage_records.change_record(new_site_text, new_un_text, new_pw_text, edit, record_dict, 32)
+        >>> manage_records.save_changes(record_dict)
+        1
+
+        """
+        changes = self._take_changes(record_dict)
+        try:
+            return self.db_executor.submit(self._write_changes, *changes).result()
+        except Exception:
+            self._requeue_changes(record_dict, *changes)
+            raise
+
+    def submit_changes(self, record_dict, menu):
+        """
+        Same as save_changes(), but returns straight away with a Future
+        of the number of records saved. The changes are taken from the
+        dictionary at once, so records can be edited while they're
+        encrypted and written on the db_executor thread. If writing
+        fails, they're marked as unsaved again on the Tk thread, through
+        "menu".
+
+        Args taken:
+        -record_dict (dictionary)
+        -menu (Tk window "menu")
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> future = manage_records.submit_changes(record_dict, menu)
+        >>> dbmanager.when_done(menu, future, lambda saved: print(saved, "records saved"))
+
+        """
+        changes = self._take_changes(record_dict)
+        future = self.db_executor.submit(self._write_changes, *changes)
+        dbmanager.when_done(menu, future, lambda saved: None,
+                            lambda error: self._requeue_changes(record_dict, *changes))
+        return future
+
+    def _take_changes(self, record_dict):
+        """
+        Private method - takes the records added, changed and deleted
+        since the last save out of the dictionary, and marks them as
+        saved. Returns (added, changed, deleted).
+
+        Can only be called by other methods in class/instance.
+        """
+        added = {x: record_dict[x] for x in sorted(self.added_ids)}  # records are tuples, so never edited in place
+        changed = {x: record_dict[x] for x in sorted(self.changed_ids)}
+        deleted = sorted(self.deleted_ids)
+        self.clear_changes()
+        self.unsaved_changes = False
+        return added, changed, deleted
+
+    def _write_changes(self, added, changed, deleted):
+        """
+        Private method - encrypts and writes changes taken by
+        _take_changes(), on the db_executor thread. Only reads the
+        changes it's given, so a failed write leaves putting them back
+        to the caller's thread.
+
+        Can only be called by other methods in class/instance.
+        """
+        if not (added or changed or deleted):
+            return 0
+        added_records, added_keys = self.record_encryption(added)
+        changed_records, changed_keys = self.record_encryption(changed)
+        self.db_manager.write_changes(list(zip(added, added_records, added_keys)),
+                                      list(zip(changed, changed_records, changed_keys)), deleted)
+        return len(added) + len(changed) + len(deleted)
+
+    def _requeue_changes(self, record_dict, added, changed, deleted):
+        """
+        Private method - marks changes whose write failed as unsaved
+        again, so they're saved next time. Called on the thread that
+        edits the records.
+
+        Can only be called by other methods in class/instance.
+        """
+        # unless the record has gone (or come back) since
+        self.added_ids.update(x for x in added if x in record_dict)
+        self.changed_ids.update(x for x in changed if x in record_dict)
+        self.deleted_ids.update(x for x in deleted if x not in record_dict)
+        self.unsaved_changes = True
+
+    def clear_changes(self):
+        """
+        Forgets which records have changed, once they are all saved or
+        the dictionary has been reloaded.
+
+        No args taken.
+        """
+        self.added_ids.clear()
+        self.changed_ids.clear()
+        self.deleted_ids.clear()
+
     def db_decryption(self):
         """
         Decrypts records once extracted from a database, given that the
@@ -155,24 +398,31 @@ class RecordManager:
         >>> manager.db_decryption()
 
         """
-        records = []
-        go_ahead, databox, keybox = self.db_manager.check_db()
-        if go_ahead == 1:  # 1 = go ahead
-            if len(databox) == len(keybox):
-                for i in range(len(databox)):
-                    decr_list = []
-                    data_record = databox[i]
-                    key_record = keybox[i]
-                    for x in range(1, 4):
-                        decrypted = ndv_cypher.VernamDecrypt.decrypt(str(data_record[x]), key_record[x])
-                        decr_list.append(decrypted)
-                    decr_tuple = (decr_list[0], decr_list[1], decr_list[2])
-                    records.append(decr_tuple)
-            elif len(databox) > len(keybox):
-                mb.showerror("Error: More data than keys")
-            elif len(databox) < len(keybox):
-                mb.showerror("Error: More keys than data")
-        elif go_ahead == 0:  # 0 = no records, encryption keys still there
+        records = list(self.iter_decryption())
+        return records
+
+    def iter_decryption(self, chunk_size=dbmanager.FETCH_CHUNK_SIZE, with_ids=False):
+        """
+        Generator version of db_decryption(). Rows are streamed from the
+        database in chunks and each one is decrypted as it arrives, so
+        the encrypted records are never all held in memory at once.
+        Set "with_ids" to True to get (personID, record) pairs.
+
+        Args taken:
+        -chunk_size=dbmanager.FETCH_CHUNK_SIZE (int)
+        -with_ids=False (boolean)
+
+        Usage example:
+        >>> manager = RecordManager()
+        >>> for site, username, password in manager.iter_decryption():
+        >>>     print(site)
+
+        """
+        go_ahead, data_count, key_count = self.db_manager.check_db_counts()
+        orphan_records, orphan_keys = [], []
+        if go_ahead == 1:  # both tables have rows, every one must have a match
+            orphan_records, orphan_keys = self.db_manager.find_orphans()
+        if go_ahead == 0:  # 0 = no records, encryption keys still there
             result = mb.askquestion(ERROR_BOX_TITLE,
                                     "Error: passw_table is empty, but key_table "
                                     "contains records. Clear 'key_table'?",
@@ -183,9 +433,132 @@ class RecordManager:
             else:
                 mb.showinfo(INFO_BOX_TITLE, "'key_table' not cleared. Program may not function correctly.",
                             icon="warning")
-        else:  # if no keys, records are just returned as they are
-            records = databox
-        return records
+        elif orphan_records:
+            mb.showerror(ERROR_BOX_TITLE, "Error: %d records have no keys (first id %d)"
+                         % (len(orphan_records), orphan_records[0]))
+        elif orphan_keys:
+            mb.showerror(ERROR_BOX_TITLE, "Error: %d keys have no records (first id %d)"
+                         % (len(orphan_keys), orphan_keys[0]))
+        else:  # 1 = go ahead, 2 = no keys (keystream records, or records are returned as they are)
+            if self.use_process_pool(data_count):
+                chunks = self._parallel_decryption()
+            else:
+                chunks = (_decrypt_rows(rows, self.master_key)
+                          for rows in self.db_manager.iter_chunks_from_db(chunk_size))
+            for records in chunks:
+                for record in records:
+                    if with_ids:
+                        yield record[0], record[1:]
+                    else:
+                        yield record[1:]
+
+    def _parallel_decryption(self):
+        """
+        Private method - decrypts chunks of rows in worker processes.
+        Chunks are yielded in the order they were read, and only a few
+        are in flight at a time so the vault isn't read all at once.
+
+        Can only be called by other methods in class/instance.
+        """
+        pending = collections.deque()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for rows in self.db_manager.iter_chunks_from_db(PARALLEL_CHUNK_SIZE):
+                pending.append(pool.submit(_decrypt_rows, rows, self.master_key))
+                if len(pending) > self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def use_process_pool(self, num_of_records):
+        """
+        Checks whether encryption/decryption of this many records
+        should be split across worker processes.
+
+        Args taken:
+        -num_of_records (int)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> manage_records.use_process_pool(20000)
+        """
+        return self.workers > 1 and num_of_records >= PARALLEL_MIN_RECORDS
+
+    def read_record(self, person_id):
+        """
+        Reads and decrypts a single record from the database. Returns
+        None if there is no record with that id.
+
+        Args taken:
+        -person_id (int)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> site, username, password = manage_records.read_record(12)
+        """
+        row = self.db_manager.read_record(person_id)
+        if row is None:
+            return None
+        return _decrypt_rows([row], self.master_key)[0][1:]
+
+    def count_records(self):
+        """
+        Returns the number of records. The database is only counted
+        the first time, after that the count is kept up to date as
+        records are added, deleted, cleared and saved.
+
+        No args taken.
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> manage_records.count_records()
+        62
+        """
+        if self.record_count is None:
+            self.record_count = self.db_manager.count_records()
+        return self.record_count
+
+    def convert_to_keystream(self, record_dict):
+        """
+        Converts the vault to the keystream cipher. A master key is
+        generated and saved to MASTER_KEY_FILE if there isn't one, then
+        all records are rewritten without keys.
+
+        Args taken:
+        -record_dict (dictionary)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> record_dict = manage_records.create_dict()
+        >>> manage_records.convert_to_keystream(record_dict)
+        """
+        if self.master_key is None:
+            master_key = ndv_cypher.KeystreamCipher.generate_master_key()
+            TextFile(MASTER_KEY_FILE).write_file(master_key.hex(), "utf-8")  # key saved before any data uses it
+            self.master_key = master_key
+        self.write_encrypted(record_dict, preserve=True)
+
+    def convert_to_vernam(self, record_dict):
+        """
+        Converts the vault back to the vernam cypher, then deletes the
+        master key.
+
+        Args taken:
+        -record_dict (dictionary)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> record_dict = manage_records.create_dict()
+        >>> manage_records.convert_to_vernam(record_dict)
+        """
+        master_key = self.master_key
+        self.master_key = None
+        try:
+            self.write_encrypted(record_dict, preserve=True)
+        except Exception:
+            self.master_key = master_key
+            raise
+        if os.path.exists(MASTER_KEY_FILE):
+            os.remove(MASTER_KEY_FILE)  # only removed once nothing is encrypted with it
 
     def add_new_record(self, site_entry, un_entry, pw_entry, new, record_dict):
         """
@@ -209,9 +582,16 @@ class RecordManager:
             sitetext = site_entry.get()
             untext = un_entry.get()
             pwtext = pw_entry.get()
-            new_index = len(record_dict) + 1
+            new_index = max(record_dict, default=0) + 1  # ids can have gaps once records are deleted
             record = (sitetext, untext, pwtext)
             record_dict[new_index] = record  # new record inserted at end of dictionary
+            if new_index in self.deleted_ids:  # id of a deleted record that hasn't been saved yet, row is reused
+                self.deleted_ids.discard(new_index)
+                self.changed_ids.add(new_index)
+            else:
+                self.added_ids.add(new_index)
+            self.record_count = self.count_records() + 1
+            self.unsaved_changes = True
             site_entry.delete(0, END)
             un_entry.delete(0, END)
             pw_entry.delete(0, END)
@@ -243,6 +623,8 @@ class RecordManager:
             newpw = new_pw_text.get()
             # old values shown in entry fields, no actual changes happen if unchanged by user
             record_dict[index] = (newsite, newun, newpw)
+            if index not in self.added_ids:  # added records are inserted with their latest values anyway
+                self.changed_ids.add(index)
             self.unsaved_changes = True
             mb.showinfo(INFO_BOX_TITLE, "Record saved.")
             edit.destroy()
@@ -268,6 +650,12 @@ class RecordManager:
         result = mb.askquestion("Delete Record", "Delete record?", icon="warning")  # checks first
         if result == 'yes':
             del record_dict[index]  # record is deleted from dictionary
+            if index in self.added_ids:  # never saved, nothing to delete from the database
+                self.added_ids.discard(index)
+            else:
+                self.changed_ids.discard(index)
+                self.deleted_ids.add(index)
+            self.record_count = self.count_records() - 1
             self.unsaved_changes = True
             mb.showinfo(INFO_BOX_TITLE, "Record deleted.")
             edit.destroy()
@@ -286,8 +674,13 @@ class RecordManager:
         >>> manage_records = RecordManager()
         >>> record_dict = manage_records.create_dict()
         """
-        records = self.db_decryption()
-        record_dict = dict(enumerate(records, start=1))  # dictionary index starts at 1 to mirror database
+        if self.restored_records is not None:
+            record_dict, self.restored_records = self.restored_records, None  # already decrypted
+        else:
+            # records are decrypted straight into the dictionary, keyed by their id in the database
+            record_dict = dict(self.iter_decryption(with_ids=True))
+        self.record_count = len(record_dict)
+        self.clear_changes()
         return record_dict
 
     def search_dict(self, record_dict, searching_text, conditions):
@@ -364,15 +757,21 @@ class RecordManager:
                 self.db_manager.clear_db("passw_table")
                 if clear_dict:
                     record_dict.clear()
+                    self.record_count = 0
+                    self.clear_changes()
             else:
                 self.db_manager.clear_db(table)  # can clear a specific table
                 record_dict.clear()
+                self.record_count = 0
+                self.clear_changes()
         elif win == "dev":  # access from dev window allows admin to clear specific tables
             if table == "passw_table":
                 result = mb.askquestion("Warning", "Clear 'passw_table'?")
                 if result == "yes":
                     self.db_manager.clear_db(table)
                     record_dict.clear()
+                    self.record_count = 0
+                    self.clear_changes()
                     mb.showinfo(INFO_BOX_TITLE, "'passw_table' cleared. It is highly recommended to clear 'key_table' "
                                                 "as well.")
                 else:
@@ -397,6 +796,8 @@ class RecordManager:
                 self.db_manager.clear_db("key_table")
                 self.db_manager.clear_db("passw_table")
                 record_dict.clear()
+                self.record_count = 0
+                self.clear_changes()
                 if not everything:  # different messageboxes show depending on what's cleared
                     mb.showinfo(INFO_BOX_TITLE, "All records cleared.")
                 else:
@@ -427,12 +828,15 @@ class RecordManager:
                                              initialfile="passwords.csv")  # 'Save as' menu
         # finicky thing where location is sometimes a tuple when cancelled (below)
         if menu.filename != "" and type(menu.filename) != tuple:
-            self.write_encrypted(record_dict, preserve=True)
+            self.submit_changes(record_dict, menu)
             csvfile = CSVFile(menu.filename)
-            csvfile.write_file(["Site", "Username", "Password"], "UTF-8")  # file header
-            for item in record_dict:
-                csvfile.write_file(record_dict[item], "UTF-8")
-            mb.showinfo(INFO_BOX_TITLE, "Data exported to %s." % menu.filename)
+            records = list(record_dict.values())  # copied, the dictionary can change while the file is written
+
+            def job():
+                csvfile.write_file(["Site", "Username", "Password"], "UTF-8")  # file header
+                csvfile.write_rows(records, "UTF-8")
+
+            self._export(menu, job, "Data exported to %s." % menu.filename)
 
     def export_as_sql_db(self, menu, record_dict):
         """
@@ -447,13 +851,13 @@ class RecordManager:
         >>> manage_records = RecordManager()
         >>> manage_records.export_as_sql_db(menu, record_dict)
         """
-        self.write_encrypted(record_dict, preserve=True)  # saves all records to database first
+        self.submit_changes(record_dict, menu)  # saves all records to database first
         menu.filename = fd.asksaveasfilename(initialdir="C:/", title="Save as...", filetypes=(("DB Files", "*.db"),
                                                                                               ("All files", "*.*")),
                                              initialfile="passwords.db")
         if menu.filename != "" and type(menu.filename) != tuple:
-            self.db_manager.export_plain_db(record_dict, menu.filename)
-            mb.showinfo(INFO_BOX_TITLE, "Data exported to %s." % menu.filename)
+            self._export(menu, self.db_executor.export_plain_db(list(record_dict.values()), menu.filename),
+                         "Data exported to %s." % menu.filename)
 
     def export_as_html(self, menu, record_dict):
         """
@@ -473,42 +877,43 @@ class RecordManager:
                                                                                               ("All files", "*.*")),
                                              initialfile="passwords.zip")
         if menu.filename != "" and type(menu.filename) != tuple:
+            filename = menu.filename
+            records = list(record_dict.values())  # copied, the dictionary can change while the file is written
 
-            # code below basically writes an html file tag by tag
-            records = []
-            for record in record_dict:
-                records.append(record_dict[record])
-            html_file = HTMLFile("html/passwords.html")
-            html_file.doct_type()
-            html_file.html()
-            html_file.head("Passwords")
-            html_file.stylesheet()
-            html_file.head_end()
-
-            html_file.body()
-            html_file.tag("h1", "Passwords")
-
-            html_file.table()
+            def job():
+                # code below basically writes an html file tag by tag
+                html_file = HTMLFile("html/passwords.html")
+                html_file.doct_type()
+                html_file.html()
+                html_file.head("Passwords")
+                html_file.stylesheet()
+                html_file.head_end()
 
-            row = ["Site", "Username", "Password"]
-            html_file.row(row)
-            row.clear()
+                html_file.body()
+                html_file.tag("h1", "Passwords")
 
-            for item in records:
-                row.append(item[0])
-                row.append(item[1])
-                row.append(item[2])
+                html_file.table()
 
+                row = ["Site", "Username", "Password"]
                 html_file.row(row)
                 row.clear()
 
-            html_file.table_end()
-            html_file.body_end()
-            html_file.html_end()
-            html_file.write_file()
-            html_zip = ZipFile(menu.filename)
-            html_zip.write_file(("html/passwords.html", "html/stylesheet.css"), None)  # actual creation of file
-            mb.showinfo(INFO_BOX_TITLE, "Data exported to %s. \nExtract stylesheet WITH HTML file." % menu.filename)
+                for item in records:
+                    row.append(item[0])
+                    row.append(item[1])
+                    row.append(item[2])
+
+                    html_file.row(row)
+                    row.clear()
+
+                html_file.table_end()
+                html_file.body_end()
+                html_file.html_end()
+                html_file.write_file()
+                html_zip = ZipFile(filename)
+                html_zip.write_file(("html/passwords.html", "html/stylesheet.css"), None)  # actual creation of file
+
+            self._export(menu, job, "Data exported to %s. \nExtract stylesheet WITH HTML file." % filename)
 
     def export_as_json(self, menu, record_dict):
         """
@@ -528,8 +933,8 @@ class RecordManager:
                                              initialfile="passwords.json")
         if menu.filename != "" and type(menu.filename) != tuple:
             jf = JSONFile(menu.filename)
-            jf.write_file(record_dict)
-            mb.showinfo(INFO_BOX_TITLE, "Data exported to %s." % menu.filename)
+            self._export(menu, self.db_executor.submit(jf.write_file, dict(record_dict)),
+                         "Data exported to %s." % menu.filename)
 
     def export_as_xml(self, menu, record_dict):
         """
@@ -549,12 +954,26 @@ class RecordManager:
                                              initialfile="passwords.xml")
         if menu.filename != "" and type(menu.filename) != tuple:
             xml = XMLFile(menu.filename)
-            xml.write_file(record_dict)
-            mb.showinfo(INFO_BOX_TITLE, "Data exported to %s." % menu.filename)
+            self._export(menu, self.db_executor.submit(xml.write_file, dict(record_dict)),
+                         "Data exported to %s." % menu.filename)
+
+    def _export(self, menu, job, message):
+        """
+        Private method - shows "message" once an export running on the
+        db_executor thread has finished. "job" is the export's Future,
+        or a function to submit.
+
+        Can only be called by other methods in class/instance.
+        """
+        if callable(job):
+            job = self.db_executor.submit(job)
+        dbmanager.when_done(menu, job, lambda result: mb.showinfo(INFO_BOX_TITLE, message),
+                            lambda error: mb.showerror(ERROR_BOX_TITLE, "Export failed: %s" % error))
 
     def create_backup(self, menu, record_dict):
         """
-        Creates a backup of password.db and keys.db in a zip file.
+        Creates a backup of the database and settings in a zip file,
+        written on the db_executor thread by write_backup().
 
         Args taken:
         -menu (Tk window "menu")
@@ -569,32 +988,478 @@ class RecordManager:
                                                                                               ("All files", "*.*")),
                                              initialfile="backup.zip")
         if menu.filename != "" and type(menu.filename) != tuple:
-            self.write_encrypted(record_dict, preserve=True)  # all data saved first
-            backup_zip = ZipFile(menu.filename)
-            backup_zip.write_file(("data/data.db", "data/settings.ini"), None)
-            mb.showinfo(INFO_BOX_TITLE, "Backup created in %s." % backup_zip.filename, parent=menu)
+            self.submit_changes(record_dict, menu)  # all data saved first, the backup is queued after it
+            filename = menu.filename
+            self._run_backup(menu, lambda: self.write_backup(filename))
+
+    def create_incremental_backup(self, menu, record_dict, differential=False):
+        """
+        Adds a backup to the backup chain in a chosen directory, written
+        on the db_executor thread by write_incremental_backup(). The first
+        backup in a directory is a full one. Set "differential" to True
+        to back up everything changed since the full backup.
+
+        Args taken:
+        -menu (Tk window "menu")
+        -record_dict (dictionary)
+        -differential=False (boolean)
+
+        Usage:
+        >>> menu = Tk()
+        >>> manage_records = RecordManager()
+        >>> manage_records.create_incremental_backup(menu, record_dict, differential=True)
+        """
+        directory = fd.askdirectory(initialdir="C:/", title="Backup directory...", parent=menu)
+        if directory != "" and type(directory) != tuple:
+            self.submit_changes(record_dict, menu)  # all data saved first, the backup is queued after it
+            self._run_backup(menu, lambda: self.write_incremental_backup(directory, differential))
+
+    def _run_backup(self, menu, job):
+        """
+        Private method - runs "job" on the db_executor thread, after any
+        save submitted before it, so the window stays usable meanwhile.
+        Says how it went once it's finished.
+
+        Can only be called by other methods in class/instance.
+        """
+        dbmanager.when_done(menu, self.db_executor.submit(job),
+                            lambda filename: mb.showinfo(INFO_BOX_TITLE, "Backup created in %s." % filename,
+                                                         parent=menu),
+                            lambda error: mb.showerror(ERROR_BOX_TITLE, "Backup failed: %s" % error, parent=menu),
+                            BACKUP_POLL_INTERVAL)
+
+    def write_backup(self, filename, progress=None):
+        """
+        Writes a backup zip of the database, settings.ini, the master
+        key and the login record archive. The database is copied with
+        DBManager.backup() while it stays in use, so it can be called
+        from any thread. "backup pages" and "backup sleep" under
+        [Preferences] in settings.ini set how fast it's copied.
+        "progress" is passed on to DBManager.backup(). Returns the name
+        of the zip file.
+
+        Args taken:
+        -filename (str)
+        -progress=None (function)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> manage_records.write_backup("backup.zip")
+
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self._zip_snapshot(filename, self._take_snapshot(directory, progress))
+        return filename
+
+    def write_incremental_backup(self, directory, differential=False, progress=None):
+        """
+        Adds a backup to the backup chain in "directory". The first one
+        is a full backup (BACKUP_BASE), every one after that only holds
+        the records changed or deleted since the backup before it. Set
+        "differential" to True to hold everything changed since the
+        full backup instead, so a restore can skip the backups before
+        it. BACKUP_MANIFEST keeps a hash of every record and the order
+        of the chain. Records are compared as they're stored, nothing
+        is decrypted. Login records are only in the full backup.
+        Returns the name of the zip file written.
+
+        Args taken:
+        -directory (str)
+        -differential=False (boolean)
+        -progress=None (function)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> manage_records.write_incremental_backup("backups")
+        'backups/base.zip'
+        >>> manage_records.write_incremental_backup("backups")
+        'backups/changes_0001.zip'
+
+        """
+        manifest_file = os.path.join(directory, BACKUP_MANIFEST)
+        manifest = None
+        if os.path.exists(manifest_file):
+            manifest = self.read_backup_manifest(directory)
+        created = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with tempfile.TemporaryDirectory() as temp:
+            snapshot = self._take_snapshot(temp, progress)
+            if manifest is None:
+                filename = os.path.join(directory, BACKUP_BASE)
+                self._zip_snapshot(filename, snapshot)
+                manifest = {"base": BACKUP_BASE, "created": created, "chain": []}
+            snapshot_db = dbmanager.DBManager(snapshot)
+            try:
+                hashes = snapshot_db.record_hashes()
+                if "hashes" not in manifest:
+                    manifest["base_hashes"] = hashes
+                else:
+                    latest = manifest["hashes"]
+                    base = manifest["base_hashes"] if differential else {}
+                    changed = [person_id for person_id, digest in hashes.items()
+                               if latest.get(person_id) != digest or (differential and base.get(person_id) != digest)]
+                    # deleted since the last backup, and since the full one for a differential backup
+                    deleted = (latest.keys() | base.keys()) - hashes.keys()
+                    changes_file = os.path.join(temp, BACKUP_CHANGES_DB)
+                    written = snapshot_db.write_record_changes(changes_file, changed, deleted)
+                    # settings and master key as well, they might have changed since the full backup
+                    backup_files = {BACKUP_CHANGES_DB: changes_file, "data/settings.ini": "data/settings.ini"}
+                    if os.path.exists(MASTER_KEY_FILE):
+                        backup_files[MASTER_KEY_FILE] = MASTER_KEY_FILE
+                    name = BACKUP_CHANGES % (len(manifest["chain"]) + 1)
+                    filename = os.path.join(directory, name)
+                    ZipFile(filename).write_files(backup_files)
+                    manifest["chain"].append({"file": name, "created": created, "differential": differential,
+                                              "written": written, "deleted": len(deleted)})
+            finally:
+                snapshot_db.close()
+        manifest["hashes"] = hashes
+        with open(manifest_file + ".tmp", "w") as file:
+            json.dump(manifest, file)
+        os.replace(manifest_file + ".tmp", manifest_file)  # old manifest kept until the new one is complete
+        return filename
+
+    @staticmethod
+    def read_backup_manifest(directory):
+        """
+        Reads BACKUP_MANIFEST from a backup directory written by
+        write_incremental_backup(). Returns the manifest as a
+        dictionary, with the record hashes keyed by personID.
+
+        Args taken:
+        -directory (str)
+
+        Usage example:
+        >>> manifest = RecordManager.read_backup_manifest("backups")
+        >>> len(manifest["chain"])
+        3
 
-    def import_backup(self, menu, record_dict):
         """
-        Imports the databases from a zip file created by create_backup()
+        with open(os.path.join(directory, BACKUP_MANIFEST)) as file:
+            manifest = json.load(file)
+        for hashes in ("base_hashes", "hashes"):
+            manifest[hashes] = {int(person_id): digest for person_id, digest in manifest[hashes].items()}
+        return manifest
+
+    def restore_backup_chain(self, directory, target):
+        """
+        Restores the database in a backup directory written by
+        write_incremental_backup() to the file "target". The full
+        backup is copied there, then the backups in the chain are
+        replayed onto it in order, starting from the last differential
+        one. The restored records are checked against the hashes in the
+        manifest, and a ValueError is raised if they don't match.
+        Returns the names of the zip files used, in order.
+
+        Args taken:
+        -directory (str)
+        -target (str, file name)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> manage_records.restore_backup_chain("backups", "restored.db")
+        ['backups/base.zip', 'backups/changes_0003.zip']
+
+        """
+        manifest = self.read_backup_manifest(directory)
+        chain = manifest["chain"]
+        start = max([x for x, backup in enumerate(chain) if backup["differential"]], default=0)
+        backup_files = [os.path.join(directory, name)
+                        for name in [manifest["base"]] + [backup["file"] for backup in chain[start:]]]
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(target + suffix):
+                os.remove(target + suffix)  # a log left over from another database would be replayed onto it
+        with zipfile.ZipFile(backup_files[0]) as backup_zip:
+            with backup_zip.open(backup_zip.namelist()[0]) as source, open(target, "wb") as file:
+                shutil.copyfileobj(source, file)  # database is written first
+        restored = dbmanager.DBManager(target)
+        try:
+            with tempfile.TemporaryDirectory() as temp:
+                for filename in backup_files[1:]:
+                    with zipfile.ZipFile(filename) as backup_zip:
+                        restored.apply_record_changes(backup_zip.extract(BACKUP_CHANGES_DB, temp))
+            if restored.record_hashes() != manifest["hashes"]:
+                raise ValueError("Restored records don't match the backup manifest.")
+        finally:
+            restored.close()
+        return backup_files
+
+    def stage_restore(self, filename):
+        """
+        Restores a backup zip from create_backup(), or the backup chain
+        of a manifest from create_incremental_backup(), into a staging
+        directory next to the database, leaving the files in use alone.
+        The staged database is migrated to the current schema and
+        checked with DBManager.check_integrity(). Only settings.ini,
+        the master key and the login record archive are taken from the
+        zip files, whatever else they hold. Raises a ValueError if the
+        backup can't be used. Returns the staging directory, for
+        decrypt_staged() and the swap done by import_backup().
+
+        Args taken:
+        -filename (str)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> staging = manage_records.stage_restore("backup.zip")
+
+        """
+        staged_db = os.path.basename(self.db_manager.filename)
+        # same file system as the database, so os.replace can swap the files
+        staging = tempfile.mkdtemp(prefix="restore_", dir=os.path.dirname(os.path.abspath(self.db_manager.filename)))
+        try:
+            if os.path.basename(filename) == BACKUP_MANIFEST:
+                backup_files = self.restore_backup_chain(os.path.dirname(filename), os.path.join(staging, staged_db))
+            else:
+                backup_files = [filename]
+                with zipfile.ZipFile(filename) as backup_zip, backup_zip.open(backup_zip.namelist()[0]) as source:
+                    with open(os.path.join(staging, staged_db), "wb") as file:
+                        shutil.copyfileobj(source, file)  # database is written first
+            file_names = INIFile('data/settings.ini').read_file()["File names"]
+            log_archive = file_names.get("log archive", dbmanager.LOG_ARCHIVE_FILE)
+            restorable = {self._zip_name(path): path for path in ("data/settings.ini", MASTER_KEY_FILE, log_archive)}
+            files = {}
+            for backup_file in backup_files:  # later backups in a chain replace files from earlier ones
+                with zipfile.ZipFile(backup_file) as backup_zip:
+                    for name in backup_zip.namelist()[1:]:
+                        if name in restorable:
+                            staged = os.path.join(staging, "file%d" % len(files))
+                            with backup_zip.open(name) as source, open(staged, "wb") as file:
+                                shutil.copyfileobj(source, file)
+                            files[restorable[name]] = staged
+            with open(os.path.join(staging, RESTORE_FILES), "w") as file:
+                json.dump({"database": staged_db, "files": files}, file)
+            staged_manager = dbmanager.DBManager(os.path.join(staging, staged_db))
+            try:
+                staged_manager.migrate()  # backups from older versions
+                problems = staged_manager.check_integrity()
+            finally:
+                staged_manager.close()
+            if problems:
+                raise ValueError("Backup failed integrity checks: %s" % "; ".join(problems))
+        except (OSError, sqlite3.Error, ValueError, KeyError, zipfile.BadZipFile) as error:
+            shutil.rmtree(staging, ignore_errors=True)
+            if isinstance(error, ValueError):
+                raise
+            raise ValueError("Backup couldn't be read: %s" % error) from error
+        return staging
+
+    def decrypt_staged(self, staging, progress=None):
+        """
+        Decrypts every record in a database staged by stage_restore(),
+        with the master key from the backup if it has one. "progress"
+        is called as progress(done, total) after each chunk. Returns
+        the record dictionary, loaded by import_backup() once the
+        backup has been swapped in. Raises a ValueError if a record
+        can't be decrypted.
+
+        Args taken:
+        -staging (str)
+        -progress=None (function)
+
+        Usage example:
+        >>> manage_records = RecordManager()
+        >>> records = manage_records.decrypt_staged(staging)
+
+        """
+        records = {}
+        staged_manager = None
+        try:
+            with open(os.path.join(staging, RESTORE_FILES)) as file:
+                restore_files = json.load(file)
+            master_key = self.master_key
+            if MASTER_KEY_FILE in restore_files["files"]:
+                master_key = bytes.fromhex(TextFile(restore_files["files"][MASTER_KEY_FILE]).read_file("utf-8").strip())
+            staged_manager = dbmanager.DBManager(os.path.join(staging, restore_files["database"]))
+            total = staged_manager.count_records()
+            for rows in staged_manager.iter_chunks_from_db():
+                for record in _decrypt_rows(rows, master_key):
+                    records[record[0]] = record[1:]
+                if progress is not None:
+                    progress(len(records), total)
+        # a key or ciphertext that doesn't fit, or staged files that can't be read
+        except (TypeError, UnicodeError, OverflowError, OSError, sqlite3.Error, KeyError, ValueError) as error:
+            raise ValueError("Backup couldn't be decrypted: %s" % error) from error
+        finally:
+            if staged_manager is not None:
+                staged_manager.close()
+        return records
+
+    def _swap_staged(self, staging):
+        """
+        Private method - moves the files staged by stage_restore() over
+        the ones in use with os.replace, so each one is either the old
+        file or the restored one, never a mix, and reloads the master
+        key. Runs on the db_executor thread, after every save submitted
+        before it, so none can land on the restored database. Removes
+        the staging directory.
+
+        Can only be called by other methods in class/instance.
+        """
+        with open(os.path.join(staging, RESTORE_FILES)) as file:
+            restore_files = json.load(file)
+        dbmanager.replace_database(os.path.join(staging, restore_files["database"]), self.db_manager.filename)
+        for destination, staged in restore_files["files"].items():
+            os.replace(staged, destination)
+        shutil.rmtree(staging, ignore_errors=True)
+        self.master_key = None
+        if os.path.exists(MASTER_KEY_FILE):
+            self.master_key = bytes.fromhex(TextFile(MASTER_KEY_FILE).read_file("utf-8").strip())
+
+    def _load_restored(self, record_dict, records):
+        """
+        Private method - fills the record dictionary with the records of
+        a backup that has been swapped in, and forgets any changes made
+        before it. Called on the thread that edits the records.
+
+        Can only be called by other methods in class/instance.
+        """
+        record_dict.clear()
+        record_dict.update(records)
+        self.restored_records = dict(records)
+        self.record_count = len(records)
+        self.clear_changes()
+        self.unsaved_changes = False
+
+    def _take_snapshot(self, directory, progress=None):
+        """
+        Private method - copies the database into "directory" with
+        DBManager.backup(), at the speed set by "backup pages" and
+        "backup sleep" under [Preferences] in settings.ini. Returns the
+        name of the copy.
+
+        Can only be called by other methods in class/instance.
+        """
+        preferences = INIFile('data/settings.ini').read_file()["Preferences"]
+        pages = int(preferences.get("backup pages", "") or dbmanager.BACKUP_PAGES)
+        sleep = float(preferences.get("backup sleep", "") or dbmanager.BACKUP_SLEEP)
+        snapshot = os.path.join(directory, os.path.basename(self.db_manager.filename))
+        self.db_manager.backup(snapshot, pages, sleep, progress)
+        return snapshot
+
+    def _zip_snapshot(self, filename, snapshot):
+        """
+        Private method - writes a backup zip of a database snapshot,
+        settings.ini, the master key and the login record archive.
+        Names in the zip are the files' paths, so importing puts them
+        back in place. The database is always written first.
+
+        Can only be called by other methods in class/instance.
+        """
+        backup_files = {self.db_manager.filename: snapshot, "data/settings.ini": "data/settings.ini"}
+        if os.path.exists(MASTER_KEY_FILE):
+            backup_files[MASTER_KEY_FILE] = MASTER_KEY_FILE  # keystream records can't be read without it
+        file_names = INIFile('data/settings.ini').read_file()["File names"]
+        log_archive = file_names.get("log archive", dbmanager.LOG_ARCHIVE_FILE)
+        if os.path.exists(log_archive):
+            backup_files[log_archive] = log_archive  # archived login records
+        ZipFile(filename).write_files(backup_files)
+
+    @staticmethod
+    def _zip_name(path):
+        """
+        Private method - the name zipfile gives a file written under
+        "path", so files in a backup can be matched to where they go.
+
+        Can only be called by other methods in class/instance.
+        """
+        name = os.path.normpath(os.path.splitdrive(path)[1]).lstrip(os.sep + (os.altsep or ""))
+        return name.replace(os.sep, "/")
+
+    def import_backup(self, menu, record_dict, on_imported=None, on_failed=None):
+        """
+        Imports a backup zip file created by create_backup(), or the
+        manifest of a backup directory written by
+        create_incremental_backup(). The backup is staged, checked and
+        decrypted on a background thread while a window shows progress,
+        then swapped in on the db_executor thread. The progress window
+        holds the input grab, so records can't be edited meanwhile.
+        Nothing is changed if any of that fails. "on_imported" is called once
+        the backup is in place, "on_failed" if it couldn't be imported.
+        Returns True if an import was started.
 
         Args taken:
         -menu (Tk window "menu")
         -record_dict (dictionary)
+        -on_imported=None (function)
+        -on_failed=None (function)
 
         Usage:
         >>> menu = Tk()
         >>> manage_records = RecordManager()
         >>> manage_records.import_backup(menu, record_dict)
         """
-        imported = False
+        started = False
         menu.filename = fd.askopenfilename(initialdir="C:/", title="Open...", filetypes=(("Zip Files", "*.zip"),
+                                                                                         ("Backup manifests",
+                                                                                          BACKUP_MANIFEST),
                                                                                          ("All files", "*.*")))
         if menu.filename != "" and type(menu.filename) != tuple:
-            self.clear_records("both", False, record_dict)  # records all cleared
-            backup_zip = ZipFile(menu.filename)
-            backup_zip.read_file()
+            filename = menu.filename
+            state = {"done": 0, "total": 0}  # written by the background thread, read by _wait_for_restore()
+
+            def run():
+                try:
+                    state["staging"] = self.stage_restore(filename)
+                    state["records"] = self.decrypt_staged(state["staging"],
+                                                           lambda done, total: state.update(done=done, total=total))
+                except Exception as error:  # anything left unhandled would leave the import waiting forever
+                    state["error"] = error
+                    if "staging" in state:
+                        shutil.rmtree(state["staging"], ignore_errors=True)
+
+            window = Toplevel(menu)
+            window.title("Importing backup")
+            window.label = ttk.Label(window, text="Checking backup...")
+            window.label.grid(row=0, column=0, padx=10, pady=5)
+            window.progress = ttk.Progressbar(window, length=250, mode="determinate")
+            window.progress.grid(row=1, column=0, padx=10, pady=5)
+            window.protocol("WM_DELETE_WINDOW", lambda: None)  # stays open until the import has finished
+            window.transient(menu)
+            window.grab_set()  # edits made meanwhile would be lost when the backup is swapped in
+            thread = threading.Thread(target=run, name="restore", daemon=True)  # window stays responsive meanwhile
+            thread.start()
+            self._wait_for_restore(menu, window, thread, state, record_dict, on_imported, on_failed)
+            started = True
+        return started
+
+    def _wait_for_restore(self, menu, window, thread, state, record_dict, on_imported, on_failed):
+        """
+        Private method - shows the progress of an import started by
+        import_backup() every BACKUP_POLL_INTERVAL milliseconds. Once
+        the backup has been decrypted, it's swapped in on the
+        db_executor thread, after any save still waiting there, and the
+        records are loaded once that has finished. Tk can only be used
+        from its own thread.
+
+        Can only be called by other methods in class/instance.
+        """
+        if thread.is_alive():
+            if state["total"]:
+                window.label.config(text="Decrypting records... %d of %d" % (state["done"], state["total"]))
+                window.progress.config(value=100 * state["done"] / state["total"])
+            menu.after(BACKUP_POLL_INTERVAL,
+                       lambda: self._wait_for_restore(menu, window, thread, state, record_dict, on_imported,
+                                                     on_failed))
+            return
+
+        def swapped(result):
+            window.destroy()
+            self._load_restored(record_dict, state["records"])
             mb.showinfo(INFO_BOX_TITLE, "Backup imported. Restarting program...")
-            imported = True
             menu.destroy()
-        return imported
+            if on_imported is not None:
+                on_imported()
+
+        def failed(error):
+            window.destroy()
+            if "staging" in state:
+                shutil.rmtree(state["staging"], ignore_errors=True)
+            mb.showerror(ERROR_BOX_TITLE, "Backup couldn't be imported: %s" % error, parent=menu)
+            if on_failed is not None:
+                on_failed()
+
+        if "error" in state:
+            failed(state["error"])
+            return
+        window.label.config(text="Replacing records...")  # window keeps the input grab until the swap is done
+        dbmanager.when_done(menu, self.db_executor.submit(self._swap_staged, state["staging"]), swapped, failed)
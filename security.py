@@ -215,7 +215,7 @@ class Security:
             attempt = "Succesful"
         else:
             attempt = "Failed"
-        dbm.write_to_log(timestamp, user, attempt)
+        log_writer.write(timestamp, user, attempt)  # buffered, written in batches by a background thread
 
     def log_in(self, pass_entry, un_entry, win):
         """
@@ -783,3 +783,6 @@ class DeveloperOptions(Security):
 dbm = dbmanager.DBManager()
 settings_file = INIFile('data/settings.ini')
 settings = settings_file.read_file()
+log_flush_size = int(settings["Preferences"].get("log flush size", dbmanager.LOG_FLUSH_SIZE))
+log_flush_interval = float(settings["Preferences"].get("log flush interval", dbmanager.LOG_FLUSH_INTERVAL))
+log_writer = dbmanager.LogWriter(dbm, log_flush_size, log_flush_interval)  # login records are written through this
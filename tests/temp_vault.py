@@ -0,0 +1,67 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Shared base for tests that need a vault of their own. The program's
+files are relative to its directory, so each test runs in a temporary
+directory holding a copy of settings.ini and a new, empty database.
+
+Usage:
+>>> class BackupTest(TempVaultTest):
+...     def test_backup(self):
+...         manage_records = self.open_records()
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import dbmanager
+import recordmanager
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TempVaultTest(unittest.TestCase):
+    """
+    Runs each test in a temporary directory, removed afterwards.
+
+    Methods:
+    -open_records(self)
+    -open_db(self)
+    """
+
+    def setUp(self):
+        old_dir = os.getcwd()
+        self.temp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp, ignore_errors=True)
+        os.mkdir(os.path.join(self.temp, "data"))
+        shutil.copy(os.path.join(REPO_DIR, "data", "settings.ini"), os.path.join(self.temp, "data"))
+        os.chdir(self.temp)  # every file the program uses is relative to its own directory
+        self.addCleanup(os.chdir, old_dir)
+
+    def open_records(self):
+        """
+        Returns a RecordManager on the temporary database, closed once
+        the test has finished.
+        """
+        manage_records = recordmanager.RecordManager()
+        self.addCleanup(manage_records.db_manager.close)
+        self.addCleanup(manage_records.db_executor.close)  # cleanups run last first, so the executor stops first
+        manage_records.db_manager.create_databases()
+        return manage_records
+
+    def open_db(self):
+        """
+        Returns a DBManager and a DBExecutor on the temporary database,
+        closed once the test has finished.
+        """
+        db_manager = dbmanager.DBManager()
+        db_executor = dbmanager.DBExecutor(db_manager)
+        self.addCleanup(db_manager.close)
+        self.addCleanup(db_executor.close)
+        db_manager.create_databases()
+        return db_manager, db_executor
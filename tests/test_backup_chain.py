@@ -0,0 +1,143 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Tests for incremental and differential backups. A backup chain is built
+on a temporary vault and restored with RecordManager.restore_backup_chain(),
+which has to give back exactly what a full backup taken at the same point
+holds.
+
+Usage:
+>>> python -m pytest tests/test_backup_chain.py
+"""
+
+
+import os
+import sqlite3
+import unittest
+import zipfile
+from unittest import mock
+
+import recordmanager
+from temp_vault import TempVaultTest
+
+
+class Entry:
+    """
+    Stands in for a Tk entry field, holding the text typed into it.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+    def get(self):
+        return self.text
+
+    def delete(self, first, last=None):
+        self.text = ""
+
+
+class BackupChainTest(TempVaultTest):
+
+    def setUp(self):
+        super().setUp()
+        patches = [mock.patch.object(recordmanager.mb, "askquestion", return_value="yes"),
+                   mock.patch.object(recordmanager.mb, "showinfo")]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.manage_records = self.open_records()
+        self.record_dict = {}
+        self.backups = os.path.join(self.temp, "backups")
+        os.mkdir(self.backups)
+
+    def add(self, site, username, password):
+        self.manage_records.add_new_record(Entry(site), Entry(username), Entry(password), None, self.record_dict)
+
+    def edit(self, index, site, username, password):
+        self.manage_records.change_record(Entry(site), Entry(username), Entry(password), mock.Mock(),
+                                          self.record_dict, index)
+
+    def delete(self, index):
+        self.manage_records.delete_record(mock.Mock(), self.record_dict, index)
+
+    @staticmethod
+    def read_rows(filename):
+        conn = sqlite3.connect(filename)
+        try:
+            return {table: conn.execute("SELECT * FROM %s ORDER BY personID" % table).fetchall()
+                    for table in ("passw_table", "key_table")}
+        finally:
+            conn.close()
+
+    def full_backup_rows(self, name):
+        """
+        Rows of the database in a full backup taken with write_backup().
+        """
+        filename = self.manage_records.write_backup(os.path.join(self.temp, name + ".zip"))
+        with zipfile.ZipFile(filename) as backup_zip:
+            database = backup_zip.extract(backup_zip.namelist()[0], os.path.join(self.temp, name))
+        return self.read_rows(database)
+
+    def chain_rows(self, name):
+        """
+        Rows of the database restored from the backup chain, and the zip
+        files the restore used.
+        """
+        target = os.path.join(self.temp, name + ".db")
+        used = self.manage_records.restore_backup_chain(self.backups, target)
+        return self.read_rows(target), [os.path.basename(filename) for filename in used]
+
+    def assert_chain_matches(self, name, expected_files):
+        rows, used = self.chain_rows(name)
+        self.assertEqual(rows, self.full_backup_rows(name + "_full"))
+        self.assertEqual(used, expected_files)
+
+    def test_chain_matches_full_backups(self):
+        for x in range(1, 6):
+            self.add("site%d" % x, "user%d" % x, "password%d" % x)
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups)
+        self.assert_chain_matches("base", ["base.zip"])
+
+        # incremental link: an add, an edit and a delete
+        self.add("site6", "user6", "password6")
+        self.edit(2, "site2", "user2", "changed password")
+        self.delete(3)
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups)
+        self.assert_chain_matches("incremental", ["base.zip", "changes_0001.zip"])
+
+        # differential link: a record added since the base is edited, one from the base is deleted
+        self.add("site7", "user7", "password7")
+        self.edit(6, "site6", "user6", "changed password")
+        self.delete(1)
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups, differential=True)
+        self.assert_chain_matches("differential", ["base.zip", "changes_0002.zip"])
+
+        # an incremental link after the differential one is replayed onto it
+        self.edit(7, "site7", "user7", "changed password")
+        self.delete(6)
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups)
+        self.assert_chain_matches("after_differential", ["base.zip", "changes_0002.zip", "changes_0003.zip"])
+
+    def test_deleted_id_reused(self):
+        for x in range(1, 4):
+            self.add("site%d" % x, "user%d" % x, "password%d" % x)
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups)
+
+        self.delete(3)
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups)
+        self.add("site4", "user4", "password4")  # takes id 3 again
+        self.manage_records.save_changes(self.record_dict)
+        self.manage_records.write_incremental_backup(self.backups, differential=True)
+        self.assert_chain_matches("reused", ["base.zip", "changes_0002.zip"])
+
+
+if __name__ == '__main__':
+    unittest.main()
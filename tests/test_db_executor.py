@@ -0,0 +1,206 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Tests for running database operations on the DBExecutor thread: the
+order operations run in, when_done() handing results back to Tk, run()
+under asyncio, and RecordManager putting the changes of a failed save
+back.
+
+Usage:
+>>> python -m pytest tests/test_db_executor.py
+"""
+
+
+import asyncio
+import threading
+import time
+import unittest
+from tkinter import TclError
+from unittest import mock
+
+import dbmanager
+from temp_vault import TempVaultTest
+
+
+class FakeWidget:
+    """
+    Stands in for a Tk widget, keeping callbacks passed to after() until
+    run_pending() is called, like the Tk main loop would.
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, function):
+        self.pending.append(function)
+
+    def run_pending(self, timeout=5):
+        end = time.monotonic() + timeout
+        while self.pending:
+            if time.monotonic() > end:
+                raise AssertionError("callbacks still pending after %s seconds" % timeout)
+            time.sleep(0.001)
+            self.pending.pop(0)()
+
+
+class DestroyedWidget:
+    """
+    Stands in for a Tk widget that has been destroyed.
+    """
+
+    def after(self, ms, function):
+        raise TclError("can't invoke \"after\" command: application has been destroyed")
+
+
+class DBExecutorTest(TempVaultTest):
+
+    def setUp(self):
+        super().setUp()
+        self.db_manager, self.db_executor = self.open_db()
+
+    def test_operations_run_in_order_on_one_thread(self):
+        order = []
+        threads = set()
+
+        def operation(x):
+            time.sleep(0.01 if x % 2 else 0)  # later operations mustn't overtake a slow one
+            order.append(x)
+            threads.add(threading.current_thread())
+
+        futures = [self.db_executor.submit(operation, x) for x in range(10)]
+        for future in futures:
+            future.result()
+        self.assertEqual(order, list(range(10)))
+        self.assertEqual(len(threads), 1)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_proxied_methods_see_earlier_writes(self):
+        self.db_executor.write_to_log("2026-01-01 10:00:00", "admin", "Success")
+        self.db_executor.write_to_log("2026-01-01 10:01:00", "admin", dbmanager.FAILED)
+        self.assertEqual(self.db_executor.count_log().result(), 2)
+
+    def test_unknown_method(self):
+        with self.assertRaises(AttributeError):
+            self.db_executor.no_such_method
+
+    def test_when_done_result(self):
+        widget = FakeWidget()
+        results = []
+        dbmanager.when_done(widget, self.db_executor.submit(lambda: 42), results.append,
+                            lambda error: self.fail("errback called"))
+        widget.run_pending()
+        self.assertEqual(results, [42])
+
+    def test_when_done_error(self):
+        def operation():
+            raise ValueError("broken")
+
+        widget = FakeWidget()
+        errors = []
+        dbmanager.when_done(widget, self.db_executor.submit(operation), lambda result: self.fail("callback called"),
+                            errors.append)
+        widget.run_pending()
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ValueError)
+
+    def test_when_done_error_box_over_widget(self):
+        def operation():
+            raise ValueError("broken")
+
+        widget = FakeWidget()
+        with mock.patch.object(dbmanager.mb, "showerror") as showerror:
+            dbmanager.when_done(widget, self.db_executor.submit(operation), lambda result: self.fail("callback called"))
+            widget.run_pending()
+        showerror.assert_called_once()
+        self.assertIs(showerror.call_args.kwargs["parent"], widget)  # not hidden behind a modal window
+
+    def test_when_done_on_destroyed_widget(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def operation():
+            started.set()
+            release.wait(5)
+
+        future = self.db_executor.submit(operation)
+        started.wait(5)
+        dbmanager.when_done(DestroyedWidget(), future, lambda result: self.fail("callback called"),
+                            lambda error: self.fail("errback called"))  # stops quietly
+        release.set()
+        future.result()
+
+    def test_run_under_asyncio(self):
+        async def main():
+            self.db_executor.write_to_log("2026-01-01 10:00:00", "admin", "Success")
+            count = await self.db_executor.run(self.db_manager.count_log)
+            other = await asyncio.gather(self.db_executor.run(lambda: threading.current_thread().name),
+                                         self.db_executor.run(self.db_manager.count_log))
+            return count, other
+
+        count, (thread_name, count_again) = asyncio.run(main())
+        self.assertEqual(count, 1)
+        self.assertEqual(count_again, 1)
+        self.assertTrue(thread_name.startswith("DBExecutor"))
+
+
+class FailedSaveTest(TempVaultTest):
+
+    def setUp(self):
+        super().setUp()
+        self.manage_records = self.open_records()
+        self.record_dict = {1: ("site1", "user1", "password1"), 2: ("site2", "user2", "password2")}
+        self.manage_records.added_ids.update(self.record_dict)
+        self.manage_records.save_changes(self.record_dict)
+
+    def make_changes(self):
+        self.record_dict[3] = ("site3", "user3", "password3")
+        self.manage_records.added_ids.add(3)
+        self.record_dict[1] = ("site1", "user1", "changed password")
+        self.manage_records.changed_ids.add(1)
+        del self.record_dict[2]
+        self.manage_records.deleted_ids.add(2)
+        self.manage_records.unsaved_changes = True
+
+    def assert_changes_queued(self):
+        self.assertEqual(self.manage_records.added_ids, {3})
+        self.assertEqual(self.manage_records.changed_ids, {1})
+        self.assertEqual(self.manage_records.deleted_ids, {2})
+        self.assertTrue(self.manage_records.unsaved_changes)
+
+    def test_failed_submit_puts_changes_back_on_tk_thread(self):
+        self.make_changes()
+        widget = FakeWidget()
+        with mock.patch.object(self.manage_records.db_manager, "write_changes", side_effect=OSError("disk full")):
+            future = self.manage_records.submit_changes(self.record_dict, widget)
+            self.assertIsInstance(future.exception(5), OSError)
+            # nothing is put back by the database thread, only by the Tk callback
+            self.assertFalse(self.manage_records.added_ids | self.manage_records.changed_ids |
+                             self.manage_records.deleted_ids)
+            widget.run_pending()
+        self.assert_changes_queued()
+        self.assertEqual(self.manage_records.save_changes(self.record_dict), 3)
+        self.assertEqual(self.manage_records.db_manager.count_records(), 2)
+
+    def test_failed_save_puts_changes_back(self):
+        self.make_changes()
+        with mock.patch.object(self.manage_records.db_manager, "write_changes", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.manage_records.save_changes(self.record_dict)
+        self.assert_changes_queued()
+
+    def test_records_edited_during_failed_save(self):
+        self.make_changes()
+        widget = FakeWidget()
+        with mock.patch.object(self.manage_records.db_manager, "write_changes", side_effect=OSError("disk full")):
+            self.manage_records.submit_changes(self.record_dict, widget).exception(5)
+            del self.record_dict[3]  # gone before the failure is handled, nothing to add any more
+            widget.run_pending()
+        self.assertEqual(self.manage_records.added_ids, set())
+        self.assertEqual(self.manage_records.changed_ids, {1})
+        self.assertEqual(self.manage_records.deleted_ids, {2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -81,6 +81,7 @@ class WindowManager:
     -feature_not_available(self)
     -auto_save_records(self, record_dict, menu)
     -stop_auto_save(self, menu)
+    -resume_auto_save(self, record_dict, menu)
     -timeout(self, record_dict, menu)
     -logout(self, menu, record_dict)
     -export(self, choice, subwin, menu, record_dict)
@@ -188,20 +189,20 @@ class WindowManager:
                 # aquires a process lock to finish saving records. avoids data corruption. will not comment after this
                 self.auto_lock.acquire()
                 self.stop_auto_save(win)
-                manage_records.write_encrypted(record_dict)
-                manage_records.db_manager.conn.close()
+                manage_records.save_changes(record_dict)
+                manage_records.db_manager.close()
                 win.destroy()
                 self.auto_lock.release()
             elif result is False:
                 self.auto_lock.acquire()
                 self.stop_auto_save(win)
-                manage_records.db_manager.conn.close()
+                manage_records.db_manager.close()
                 win.destroy()
                 self.auto_lock.release()
         else:
             self.auto_lock.acquire()
             self.stop_auto_save(win)
-            manage_records.db_manager.conn.close()
+            manage_records.db_manager.close()
             win.destroy()
             self.auto_lock.release()
 
@@ -229,10 +230,11 @@ class WindowManager:
         """
         self.auto_lock.acquire()
         if self.stopped:
+            self.auto_lock.release()
             return
             # ends the function if the process is stopped
-        manage_records.write_encrypted(record_dict, preserve=True)
-        manage_records.unsaved_changes = False
+        # only records changed since the last save, written in background
+        manage_records.submit_changes(record_dict, menu)
         self.auto_lock.release()
         self.autosave_id = menu.after(int(settings["Preferences"]["autosave time"]) * 1000,
                                       lambda: self.auto_save_records(record_dict, menu))
@@ -258,6 +260,22 @@ class WindowManager:
         if self.autosave_id is not None:
             menu.after_cancel(self.autosave_id)
 
+    def resume_auto_save(self, record_dict, menu):
+        """
+        Restarts autosave after stop_auto_save(), saving straight away.
+
+        Args taken:
+        -record_dict (dictionary of records)
+        -menu (Tk window "menu")
+
+        Usage:
+        >>> wm.stop_auto_save(menu)
+        >>> wm.resume_auto_save(record_dict, menu)
+
+        """
+        self.stopped = False
+        self.auto_save_records(record_dict, menu)
+
     def timeout(self, record_dict, menu):
         """
         Begins login timeout process in background.
@@ -468,7 +486,7 @@ class MainWindow(GUI):
         if self.system == 'Linux':
             self.master.configure(background=self.BGCOL)
         self.master.protocol('WM_DELETE_WINDOW', lambda: wm.close(self.master, self.record_dict))
-        wm.auto_save_records(self.record_dict, self.master)
+        wm.resume_auto_save(self.record_dict, self.master)  # stopped by a log out or backup import before
         if bool(settings["Preferences"]["timeout active"]):
             wm.timeout(self.record_dict, self.master)
 
@@ -506,9 +524,12 @@ class MainWindow(GUI):
                 highest = self.upper_bound
             else:
                 highest = len(box)
-            ttk.Label(self.frame, text='%d - %d of %d' % (self.lower_bound + 1, highest, len(box))).grid(row=0,
-                                                                                                         column=3,
-                                                                                                         sticky=W)
+            total = manage_records.count_records()  # cached, the table isn't scanned
+            if len(box) < total:  # search results show the total as well
+                showing = '%d - %d of %d (%d total)' % (self.lower_bound + 1, highest, len(box), total)
+            else:
+                showing = '%d - %d of %d' % (self.lower_bound + 1, highest, total)
+            ttk.Label(self.frame, text=showing).grid(row=0, column=3, sticky=W)
             # field headers
             ttk.Label(self.frame, text="Site", font=self.HEADER).grid(row=1, column=1)
             ttk.Label(self.frame, text="Username", font=self.HEADER).grid(row=1, column=2)
@@ -684,8 +705,14 @@ class MainWindow(GUI):
         backup_menu = Menu(self.menubar, tearoff=0)
         backup_menu.add_command(label="Create backup", command=lambda: manage_records.create_backup(self.master,
                                                                                                     self.record_dict))
-        backup_menu.add_command(label="Import backup", command=lambda: manage_records.import_backup(self.master,
-                                                                                                    self.record_dict))
+        backup_menu.add_command(label="Create incremental backup",
+                                command=lambda: manage_records.create_incremental_backup(self.master,
+                                                                                         self.record_dict))
+        backup_menu.add_command(label="Create differential backup",
+                                command=lambda: manage_records.create_incremental_backup(self.master,
+                                                                                         self.record_dict,
+                                                                                         differential=True))
+        backup_menu.add_command(label="Import backup", command=self.import_backup)
         tools_menu.add_cascade(label="Backup", menu=backup_menu)
         if admin:
             # ensures dev options are only shown if user is admin
@@ -882,7 +909,7 @@ class MainWindow(GUI):
         self.page += 1
         self.lower_bound = self.upper_bound  # new lower bound will be same as old upper bound
         # condition to see if all spaces for records are needed
-        if not (self.upper_bound + self.max_records_shown > len(self.record_dict)):
+        if not (self.upper_bound + self.max_records_shown > manage_records.count_records()):
             self.upper_bound += self.max_records_shown
         else:
             # upper bound is set to length of records if on last page
@@ -904,7 +931,8 @@ class MainWindow(GUI):
 
     def save_records(self):
         """
-        Saves all records to database.
+        Saves all records to database, in the background. A message is
+        shown once they're saved.
 
         No args taken.
 
@@ -913,8 +941,10 @@ class MainWindow(GUI):
         >>> maincontent = MainWindow(main)
         >>> maincontent.save_records()
         """
-        manage_records.write_encrypted(self.record_dict, preserve=True)
-        mb.showinfo(INFO_BOX_TITLE, "Records saved.", parent=self.master)
+        dbmanager.when_done(self.master, manage_records.submit_changes(self.record_dict, self.master),
+                            lambda saved: mb.showinfo(INFO_BOX_TITLE, "Records saved.", parent=self.master),
+                            lambda error: mb.showerror(ERROR_BOX_TITLE, "Records couldn't be saved: %s" % error,
+                                                       parent=self.master))
 
     def clear_records(self):
         """
@@ -1017,7 +1047,9 @@ class MainWindow(GUI):
 
     def import_backup(self):
         """
-        Handles importing of a backup.
+        Handles importing of a backup. Autosave is paused until the
+        import has finished, and unsaved changes are only thrown away
+        once the user agrees.
 
         No args taken.
 
@@ -1027,9 +1059,18 @@ class MainWindow(GUI):
         >>> main.mainloop()
         >>> maingui.import_backup()
         """
-        imported = manage_records.import_backup(self.master, self.record_dict)
-        if imported:
-            wm.startup()
+        if manage_records.unsaved_changes:
+            if not mb.askyesno("Import backup", "Unsaved changes will be lost when the backup is imported. Continue?",
+                               parent=self.master, icon='warning'):
+                return
+        wm.stop_auto_save(self.master)  # nothing is saved over the backup while it's swapped in
+
+        def resume():
+            wm.resume_auto_save(self.record_dict, self.master)
+
+        # restarts once imported
+        if not manage_records.import_backup(self.master, self.record_dict, wm.startup, resume):
+            resume()
 
     def log_out(self):
         """
@@ -1568,9 +1609,26 @@ class LoginRecords(GUI):
     Args taken:
     -master (Tk window)
     
-    No methods.
-    
-    
+    Methods:
+    -create_frame(self)
+    -clear_frame(self)
+    -create_table(self)
+    -refresh_table(self)
+    -next_page(self)
+    -previous_page(self)
+    -calculate_page_numbers(self, num_of_records)
+    -read_page(self, page, page_starts)
+    -show_page(self, login_records, log_count)
+    -create_summary(self)
+    -show_summary(self, frame, figures)
+    -toggle_summary(self)
+
+    Only one page of login records is read from the database at a
+    time, with DBManager.read_log_page(). The summary view shows
+    figures worked out by sqlite, so the log is never read in full.
+    Both are read on the database thread (RecordManager.db_executor)
+    and shown once they arrive, so the window doesn't freeze.
+
     Usage:
     >>> loginrec = Tk()
     >>> loginrecwin = LoginRecords(loginrec)
@@ -1581,15 +1639,19 @@ class LoginRecords(GUI):
         # some similarities to main window
         self.set_up_window()
         self.frame = None
-        self.login_records = manage_records.db_manager.read_log()
         self.max_records_shown = int(settings['Preferences']['logins displayed'])
-        self.lower_bound = 0
-        self.upper_bound = self.max_records_shown
         self.page = 1
         self.no_of_pages = 1
+        self.page_starts = [None]  # (date, logID) each page was read after, the first page starts at the top
+        self.summary_shown = False
+        self.log_count = 0
+        self.login_records = None  # None until the first page has been read
+        self.loading = False  # a page is being read
         if self.system == 'Linux':
             self.master.configure(background=self.BGCOL)
         self.create_table()
+        manage_records.db_executor.submit(log_writer.flush)  # buffered login records are shown too
+        self.read_page(1, [None])
 
     # functions below are shared with main window, will not comment
 
@@ -1642,37 +1704,114 @@ class LoginRecords(GUI):
 
         """
         self.create_frame()
-        if len(self.login_records) > 0:
+        if self.login_records is None:
+            ttk.Label(self.frame, text='Loading login records...').grid(row=1)
+        elif len(self.login_records) > 0:
             ttk.Label(self.frame, text="Date/Time", font=self.HEADER).grid(row=0, column=0, padx=self.DEFAULT_PAD + 5)
             ttk.Label(self.frame, text="User", font=self.HEADER).grid(row=0, column=1, padx=self.DEFAULT_PAD + 5)
             ttk.Label(self.frame, text="Success", font=self.HEADER).grid(row=0, column=2, padx=self.DEFAULT_PAD + 5)
-            if len(self.login_records) <= self.max_records_shown:
-                for i in range(len(self.login_records)):
-                    record = self.login_records[i]
-                    for x in range(1, 4):
-                        ttk.Label(self.frame, text=record[x], anchor=W).grid(row=i + 1, column=x - 1)
-            else:
-                for i in range(self.lower_bound, self.upper_bound):
-                    record = self.login_records[i]
-                    for x in range(1, 4):
-                        ttk.Label(self.frame, text=record[x], anchor=W).grid(row=i + 1, column=x - 1)
-                if self.upper_bound < len(self.login_records):
-                    ttk.Button(self.frame, text='Next', command=self.next_page).grid(row=self.upper_bound + 2, column=3)
+            # only the current page is held, read from the database
+            for i in range(len(self.login_records)):
+                record = self.login_records[i]
+                for x in range(1, 4):
+                    ttk.Label(self.frame, text=record[x], anchor=W).grid(row=i + 1, column=x - 1)
+            if self.log_count > self.max_records_shown:
+                self.calculate_page_numbers(self.log_count)
+                if self.page < self.no_of_pages:
+                    ttk.Button(self.frame, text='Next', command=self.next_page).grid(row=self.max_records_shown + 2,
+                                                                                     column=3)
                 if self.page != 1:
-                    ttk.Button(self.frame, text='Back', command=self.previous_page).grid(row=self.upper_bound + 2,
-                                                                                         column=0)
-                if self.max_records_shown < len(self.login_records):
-                    ttk.Label(self.frame, text='Page').grid(row=self.upper_bound + 2, column=1, sticky=E)
-                    self.calculate_page_numbers(self.login_records)
-                    ttk.Label(self.frame, text=str("%d/%d" % (self.page, self.no_of_pages))).grid(
-                        row=self.upper_bound + 2, column=2, sticky=W)
+                    ttk.Button(self.frame, text='Back', command=self.previous_page).grid(
+                        row=self.max_records_shown + 2, column=0)
+                ttk.Label(self.frame, text='Page').grid(row=self.max_records_shown + 2, column=1, sticky=E)
+                ttk.Label(self.frame, text=str("%d/%d" % (self.page, self.no_of_pages))).grid(
+                    row=self.max_records_shown + 2, column=2, sticky=W)
             clear_button = ttk.Button(self.frame, text="Clear login records",
                                       command=lambda: manage_records.db_manager.clear_log(self.frame))
             clear_button.grid(row=0, column=3)
+            ttk.Button(self.frame, text="Summary", command=self.toggle_summary).grid(row=1, column=3)
         else:
             self.master.geometry("%dx45" % self.DEFAULT_WIDTH)
             ttk.Label(self.frame, text='No previous logins.').grid(row=1)
 
+    def create_summary(self):
+        """
+        Creates the summary of login records inside of frame in login
+        record window: each user's last successful login and longest
+        run of failed logins, then attempts per user for the most
+        recent days. Figures are read on the database thread and filled
+        in by show_summary().
+
+        No args taken.
+
+        Usage handled internally by class.
+        """
+        self.create_frame()
+        db_manager = manage_records.db_manager
+        figures = manage_records.db_executor.submit(lambda: (dict(db_manager.last_successes()),
+                                                             db_manager.failure_streaks(),
+                                                             db_manager.login_summary("day", self.max_records_shown)))
+        ttk.Label(self.frame, text="User", font=self.HEADER).grid(row=0, column=0, padx=self.DEFAULT_PAD + 5)
+        ttk.Label(self.frame, text="Last success", font=self.HEADER).grid(row=0, column=1, padx=self.DEFAULT_PAD + 5)
+        ttk.Label(self.frame, text="Most failures in a row", font=self.HEADER).grid(row=0, column=2,
+                                                                                  padx=self.DEFAULT_PAD + 5)
+        ttk.Button(self.frame, text="Show records", command=self.toggle_summary).grid(row=0, column=3)
+        frame = self.frame
+        dbmanager.when_done(self.master, figures, lambda result: self.show_summary(frame, result))
+
+    def show_summary(self, frame, figures):
+        """
+        Fills in the summary once create_summary() has read it, unless
+        the frame has been replaced meanwhile.
+
+        Args taken:
+        -frame (Tk frame the summary was started in)
+        -figures (tuple of last successes, failure streaks and days)
+
+        Usage handled internally by class.
+        """
+        if frame is not self.frame:
+            return
+        last_successes, streaks, days = figures
+        streaks = {streak[0]: streak for streak in streaks}
+        users = list(last_successes) + [user for user in streaks if user not in last_successes]
+        row = 1
+        for user in users:
+            ttk.Label(frame, text=user, anchor=W).grid(row=row, column=0)
+            ttk.Label(frame, text=last_successes.get(user, "Never"), anchor=W).grid(row=row, column=1)
+            if user in streaks:
+                streak = "%d (%s to %s)" % streaks[user][1:]
+            else:
+                streak = "0"
+            ttk.Label(frame, text=streak, anchor=W).grid(row=row, column=2)
+            row += 1
+
+        ttk.Label(frame).grid(row=row, column=0)  # gap between the two tables
+        row += 1
+        ttk.Label(frame, text="Day", font=self.HEADER).grid(row=row, column=0, padx=self.DEFAULT_PAD + 5)
+        ttk.Label(frame, text="User", font=self.HEADER).grid(row=row, column=1, padx=self.DEFAULT_PAD + 5)
+        ttk.Label(frame, text="Successful", font=self.HEADER).grid(row=row, column=2, padx=self.DEFAULT_PAD + 5)
+        ttk.Label(frame, text="Failed", font=self.HEADER).grid(row=row, column=3, padx=self.DEFAULT_PAD + 5)
+        for day in days:
+            row += 1
+            for x in range(4):
+                ttk.Label(frame, text=day[x], anchor=W).grid(row=row, column=x)
+
+    def toggle_summary(self):
+        """
+        Switches between the login records and the summary.
+
+        No args taken.
+
+        Usage handled internally by class.
+        """
+        self.summary_shown = not self.summary_shown
+        self.clear_frame()
+        if self.summary_shown:
+            self.create_summary()
+        else:
+            self.create_table()
+
     def refresh_table(self):
         """
         Refreshes table in login record window.
@@ -1690,44 +1829,88 @@ class LoginRecords(GUI):
 
     def next_page(self):
         """
-        Moves onto the next page of records by changing the upper and lower bounds.
+        Moves onto the next page of records, read after the last record shown.
 
         No args taken.
 
         Usage handled internally by class.
         """
-        self.page += 1
-        self.lower_bound = self.upper_bound
-        if not (self.upper_bound + self.max_records_shown > len(self.login_records)):
-            self.upper_bound += self.max_records_shown
-        else:
-            self.upper_bound = len(self.login_records)
-        self.refresh_table()
+        if self.loading:
+            return  # still reading the page before
+        last = self.login_records[-1]
+        self.read_page(self.page + 1, self.page_starts + [(last[1], last[0])])  # (date, logID)
 
     def previous_page(self):
         """
-        Moves back to the previous page of records by changing the upper and lower bounds.
+        Moves back to the previous page of records, read again from where it started.
 
         No args taken.
 
         Usgae handled internally by class.
         """
-        self.upper_bound = self.lower_bound
-        self.lower_bound -= self.max_records_shown
-        self.page -= 1
-        self.refresh_table()
+        if self.loading:
+            return  # still reading the page before
+        self.read_page(self.page - 1, self.page_starts[:-1])
 
-    def calculate_page_numbers(self, box):
+    def read_page(self, page, page_starts):
+        """
+        Reads page number "page" of login records, starting after the
+        last (date, logID) pair in "page_starts" (None for the first
+        page), and the number of records, in one operation on the
+        database thread. The page is only moved to once it has been
+        read, then it's shown with show_page(). If reading fails, the
+        page shown stays as it was.
+
+        Args taken:
+        -page (int)
+        -page_starts (list)
+
+        Usage handled internally by class.
+        """
+        self.loading = True
+        db_manager = manage_records.db_manager
+        after = page_starts[-1]
+        login_page = manage_records.db_executor.submit(lambda: (db_manager.read_log_page(after, self.max_records_shown),
+                                                                db_manager.count_log()))
+
+        def read(result):
+            self.page = page
+            self.page_starts = page_starts
+            self.show_page(*result)
+
+        def failed(error):
+            self.loading = False
+            mb.showerror(ERROR_BOX_TITLE, "Login records couldn't be read: %s" % error, parent=self.master)
+
+        dbmanager.when_done(self.master, login_page, read, failed)
+
+    def show_page(self, login_records, log_count):
+        """
+        Shows a page of login records read by read_page().
+
+        Args taken:
+        -login_records (list of tuples)
+        -log_count (int)
+
+        Usage handled internally by class.
+        """
+        self.loading = False
+        self.login_records = login_records
+        self.log_count = log_count
+        if not self.summary_shown:
+            self.refresh_table()
+
+    def calculate_page_numbers(self, num_of_records):
         """
         Calculates the number of the page currently shown in the login record window..
 
         Args taken:
-        -box (list of records)
+        -num_of_records (int)
 
         Usage handled internally by class.
         """
-        self.no_of_pages = (len(box) / self.max_records_shown)
-        if (len(box) % self.max_records_shown) > 0:
+        self.no_of_pages = (num_of_records // self.max_records_shown)
+        if (num_of_records % self.max_records_shown) > 0:
             self.no_of_pages += 1
 
 
@@ -1837,7 +2020,9 @@ class DevOptionsWindow(GUI):
     -master (tk window)
     -record_dict(dictionary)
     
-    No methods.
+    Methods:
+    -clear_all_details(self)
+    -show_pragmas(self)
     
     Usage:
     >>> dev = Tk()
@@ -1865,8 +2050,10 @@ class DevOptionsWindow(GUI):
                    command=lambda: manage_records.clear_records("log_table", "main", self.record_dict)
                    ).grid(row=3, column=0, padx=self.DEFAULT_PAD)
 
+        ttk.Button(self.master, text="Show database settings",
+                   command=self.show_pragmas).grid(row=4, column=0, padx=self.DEFAULT_PAD)
+
         # admin account settings
-        # ttk.Label(self.master).grid(row=4, column=0)
         ttk.Label(self.master, text="Admin account settings", font=self.HEADER).grid(row=5, column=0,
                                                                                      padx=self.DEFAULT_PAD)
         ttk.Label(self.master, text="New admin password").grid(row=6, column=0, padx=self.DEFAULT_PAD)
@@ -1942,6 +2129,18 @@ class DevOptionsWindow(GUI):
         if complete:
             self.dev_options.clear_all(self.master)
 
+    def show_pragmas(self):
+        """
+        Shows the database settings actually in effect.
+
+        No args taken.
+
+        Usage handled internally by class.
+        """
+        pragmas = manage_records.db_manager.read_pragmas()
+        lines = ["%s: %s" % (pragma, value) for pragma, value in pragmas.items()]
+        mb.showinfo(INFO_BOX_TITLE, "\n".join(lines), parent=self.master)
+
 
 # instantiation of necessary classes and calling of functions
 secure = Security()
@@ -1950,6 +2149,7 @@ wm = WindowManager()
 settings_file = INIFile('data/settings.ini')
 settings = settings_file.read_file()
 manage_records.db_manager.create_databases()
+manage_records.db_executor.apply_log_retention()  # archived off the Tk thread, limits in settings.ini
 
 if __name__ == '__main__':
     wm.startup()